@@ -0,0 +1,61 @@
+"""Climate Change Awareness (CliChA), Atomic File Writes
+
+This module provides write_atomically, which the files rewritten in place (the reports, the run
+manifest, the document frequency checkpoints and the idf files) are written with, so that
+neither a crash nor another process writing the same file at the same time can leave one
+half-written.
+
+Copyright (c) 2020 Akshat Naik and Tony Hu.
+Licensed under the MIT License. See LICENSE in the project root for license information.
+"""
+import os
+import tempfile
+from typing import Callable, Optional
+
+
+def write_atomically(path: str, mode: str, write: Callable[[object], None],
+                     encoding: Optional[str] = None) -> None:
+    """Calls write with a temporary file opened in mode (and encoding, if any), and then moves
+    it to path.
+
+    The temporary file has a unique name in the directory of path, so processes writing the
+    same path at once (for ex: the workers of a pool, or the GUI and a run from the command
+    line) never write to the same file. The last one to finish wins. A process that has already
+    opened path keeps the file it opened.
+
+    >>> path = os.path.join(tempfile.mkdtemp(), 'report.txt')
+    >>> write_atomically(path, 'w', lambda f: f.write('ice,sea'))
+    >>> with open(path) as f:
+    ...     f.read()
+    'ice,sea'
+    >>> os.listdir(os.path.dirname(path))
+    ['report.txt']
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                     prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            write(f)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['os', 'tempfile', 'typing', 'python_ta.contracts'],
+        'allowed-io': ['write_atomically'],
+        'max-line-length': 100,
+        'max-locals': 25,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
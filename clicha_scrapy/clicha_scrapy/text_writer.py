@@ -7,13 +7,55 @@ Copyright (c) 2020 Akshat Naik and Tony Hu.
 Licensed under the MIT License. See LICENSE in the project root for license information.
 """
 import logging
+import mmap
+import os
+import re
+import struct
 import sys
-from typing import TextIO
+from array import array
+from typing import BinaryIO, TextIO
+
+
+# the suffix of the sidecar file holding the offset index of a corpus file
+INDEX_SUFFIX = '.idx'
+# each index entry is the byte start and byte length of an article, as little-endian uint64s
+INDEX_ENTRY = struct.Struct('<QQ')
+ARTICLE_DELIMITER = b"--------"
+# the last text of a file written by the TextWriter is not an article
+TRAILER = re.compile(rb'\s*(Articles crawled: \d+\s*)?')
 
 
 class TextWriter:
     """A utility class that handles text formatting and file IO for the Spiders.
 
+    Along with the articles, an offset index is written to a sidecar file (the path of the file
+    followed by INDEX_SUFFIX). It holds the byte start and byte length of each article, i.e. of
+    each text that splitting the file on the article delimiter would produce, so that articles
+    can be read back at random (see corpus_reader.py). The articles are always those of
+    build_index: when a TextWriter appends to a file that already has articles, the file is
+    indexed again first, and the first article appended starts right after the last delimiter,
+    so it includes the trailer written by the TextWriter that wrote the file before, as it does
+    in the split.
+
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'corpus.txt')
+    >>> for bodies in (['first', 'second'], ['third']):
+    ...     writer = TextWriter(path)
+    ...     for body in bodies:
+    ...         writer.append_article(body)
+    ...     writer.close()
+    >>> with open(path, 'rb') as f:
+    ...     data = f.read()
+    >>> with open(path + INDEX_SUFFIX, 'rb') as f:
+    ...     written = list(INDEX_ENTRY.iter_unpack(f.read()))
+    >>> [data[start:start + length] for start, length in written]
+    [b'0-> first\\n', b'\\n1-> second\\n', b'\\nArticles crawled: 2\\n0-> third\\n']
+    >>> data.split(ARTICLE_DELIMITER)[:-1] == [data[s:s + n] for s, n in written]
+    True
+    >>> rebuilt = build_index(path)
+    >>> written == list(zip(rebuilt[::2], rebuilt[1::2]))
+    True
+
     Instance Attributes:
         - counter: the number of articles already written to self._file since it opened
     """
@@ -22,8 +64,12 @@ class TextWriter:
     # Private Instance Attributes:
     #   - _path: the path to the file
     #   - _file: the file to write to
+    #   - _index: the file to write the offset index to
+    #   - _start: the byte offset in _file at which the next article starts
     _path: str
     _file: TextIO
+    _index: BinaryIO
+    _start: int
 
     def __init__(self, file_path: str) -> None:
         self.counter = 0
@@ -36,12 +82,25 @@ class TextWriter:
         """
         # don't open file until first use
         if not hasattr(self, '_file'):
+            if os.path.exists(self._path):
+                # index the articles already in the file the way build_index does (its index may
+                # be missing, or written before the last session), and start the next article
+                # where build_index would
+                self._start = _write_index(self._path, False)[1]
+            else:
+                self._start = 0
             # encoding has to be manually set to bypass Windows locale settings
             self._file = open(self._path, 'a', encoding='utf-8', errors='ignore')
+            self._index = open(self._path + INDEX_SUFFIX, 'ab')
 
         try:
-            self._file.write(str(self.counter) + '-> ' + body)
-            self._file.write('\n--------\n')
+            self._file.write(str(self.counter) + '-> ' + body + '\n')
+            end = self._file.tell()
+            self._file.write('--------')
+            self._index.write(INDEX_ENTRY.pack(self._start, end - self._start))
+            # the newline after the delimiter belongs to the next article
+            self._start = self._file.tell()
+            self._file.write('\n')
 
             self.counter += 1
         except IOError:
@@ -52,11 +111,52 @@ class TextWriter:
         """Close the TextWriter and its associated file."""
         self._file.write('Articles crawled: ' + str(self.counter) + '\n')
         self._file.close()
+        self._index.close()
 
     def __del__(self) -> None:
-        """Closes the file if it has not been already."""
+        """Closes the files if they have not been already."""
         if hasattr(self, '_file') and not self._file.closed:
             self._file.close()
+        if hasattr(self, '_index') and not self._index.closed:
+            self._index.close()
+
+
+def build_index(filename: str) -> array:
+    """Scans filename for article delimiters, writes its sidecar index and returns the offsets.
+
+    Each article is a text of the split of the file on the article delimiter, so a trailer
+    written in the middle of the file by an earlier session of the TextWriter is part of the
+    article after it. The trailing 'Articles crawled: N' text at the end of the file (or the
+    bare newline left behind if the crawl was interrupted) is not indexed.
+    """
+    return _write_index(filename, True)[0]
+
+
+def _write_index(filename: str, with_tail: bool) -> tuple:
+    """Scans filename for article delimiters, writes its sidecar index and returns a tuple of
+    the offsets and the byte at which the text after the last delimiter starts, i.e. where the
+    next article appended to filename starts.
+
+    The text after the last delimiter is indexed as an article only if with_tail is True and it
+    is not just the trailer.
+    """
+    offsets = array('Q')
+    start = 0
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                end = mm.find(ARTICLE_DELIMITER)
+                while end != -1:
+                    offsets.extend((start, end - start))
+                    start = end + len(ARTICLE_DELIMITER)
+                    end = mm.find(ARTICLE_DELIMITER, start)
+                if with_tail and not TRAILER.fullmatch(mm[start:]):
+                    offsets.extend((start, size - start))
+    with open(filename + INDEX_SUFFIX, 'wb') as f:
+        for i in range(0, len(offsets), 2):
+            f.write(INDEX_ENTRY.pack(offsets[i], offsets[i + 1]))
+    return offsets, start
 
 
 if __name__ == '__main__':
@@ -65,7 +165,7 @@ if __name__ == '__main__':
 
     import python_ta
     python_ta.check_all(config={
-        'allowed-io': ['append_article'],
+        'allowed-io': ['append_article', '_write_index'],
         'extra-imports': ['scrapy',
                           'scrapy.spiders',
                           'scrapy.http',
@@ -76,6 +176,10 @@ if __name__ == '__main__':
                           'random',
                           'typing',
                           'logging',
+                          'mmap',
+                          're',
+                          'array',
+                          'struct',
                           'os',
                           'sys',
                           'inspect',
@@ -0,0 +1,103 @@
+"""Climate Change Awareness (CliChA), Matcher Backend Comparison
+
+This module compares the 'aho-corasick' matcher backend against spaCy's PhraseMatcher on the
+existing corpora, both in the results they give and in how long they take. Until the two agree,
+articles_process_yearly only matches with the 'spacy' backend, so that no stored CAI depends on
+approximate_token_count.
+
+Copyright (c) 2020 Akshat Naik and Tony Hu.
+Licensed under the MIT License. See LICENSE in the project root for license information.
+"""
+import time
+import spaCy_helpers as sh
+import resources
+from keyword_automaton import approximate_token_count
+
+
+def compare_matchers(filenames: list, num: int = -1) -> dict:
+    """Returns a report comparing the 'spacy' and 'aho-corasick' matcher backends (with the
+    'LOWER' attribute) on the first num articles of each file in filenames.
+
+    The report is a dict with the following keys:
+        - 'articles': the number of articles compared
+        - 'agreeing': the number of articles for which both backends return the same
+        (total matches, distinct matches, keyword counts)
+        - 'disagreements': a list of (filename, article index, spacy result, aho-corasick result)
+        - 'spacy_seconds': the time spent tokenizing and matching with the PhraseMatcher
+        - 'aho_corasick_seconds': the time spent matching (and counting tokens) with the automaton
+        - 'speedup': spacy_seconds / aho_corasick_seconds
+        - 'length_error': the mean relative error of approximate_token_count against len(doc)
+
+    Instance Attributes:
+        - filenames: the names of the corpus files, for ex: 'clicha_scrapy/nytimes/1990.txt'
+        - num: the number of articles to compare in each file.
+        if num  == -1, then all articles are compared
+    """
+    spacy_matcher = resources.matcher()
+    automaton = resources.matcher(backend="aho-corasick")
+    report = {'articles': 0, 'agreeing': 0, 'disagreements': [],
+              'spacy_seconds': 0.0, 'aho_corasick_seconds': 0.0}
+    length_error = 0.0
+    for filename in filenames:
+        texts = list(sh.iter_texts_from_file(filename, num))
+
+        start = time.perf_counter()
+        spacy_results = []
+        for doc in sh.iter_docs(texts):
+            spacy_results.append((sh.phrase_matching(doc, spacy_matcher), len(doc)))
+        report['spacy_seconds'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        automaton_results = [(sh.phrase_matching(text, automaton), approximate_token_count(text))
+                             for text in texts]
+        report['aho_corasick_seconds'] += time.perf_counter() - start
+
+        for i, ((expected, length), (actual, approximate_length)) in enumerate(
+                zip(spacy_results, automaton_results)):
+            report['articles'] += 1
+            # keywords with equal counts may be listed in a different order
+            if expected[:2] == actual[:2] and dict(expected[2]) == dict(actual[2]):
+                report['agreeing'] += 1
+            else:
+                report['disagreements'].append((filename, i, expected, actual))
+            length_error += abs(approximate_length - length) / max(length, 1)
+    report['speedup'] = report['spacy_seconds'] / max(report['aho_corasick_seconds'], 1e-9)
+    report['length_error'] = length_error / max(report['articles'], 1)
+    return report
+
+
+def print_report(report: dict) -> None:
+    """Prints a report returned by compare_matchers."""
+    print(f"Articles compared: {report['articles']}")
+    print(f"Articles with identical matches: {report['agreeing']}")
+    print(f"spaCy PhraseMatcher: {report['spacy_seconds']:.2f}s")
+    print(f"Aho-Corasick automaton: {report['aho_corasick_seconds']:.2f}s "
+          f"({report['speedup']:.1f}x faster)")
+    print(f"Mean relative error of the approximate article lengths: {report['length_error']:.2%}")
+    for filename, i, expected, actual in report['disagreements'][:10]:
+        print(f"{filename} article {i}: spacy {expected} vs aho-corasick {actual}")
+
+
+if __name__ == '__main__':
+    # Sample Usage:
+    # print_report(compare_matchers([f'clicha_scrapy/nytimes/{year}.txt'
+    #                                for year in (1900, 1950, 1988, 2006)]))
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': [
+            'time', 'spaCy_helpers', 'resources', 'keyword_automaton',
+            'python_ta.contracts'
+        ],
+        'allowed-io': ['print_report'],
+        'max-line-length': 100,
+        'max-locals': 25,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
@@ -0,0 +1,176 @@
+"""Climate Change Awareness (CliChA), Corpus Reader
+
+This module provides random access to the articles of a corpus file written by the TextWriter,
+using the offset index stored in the sidecar file next to it.
+
+Copyright (c) 2020 Akshat Naik and Tony Hu.
+Licensed under the MIT License. See LICENSE in the project root for license information.
+"""
+import mmap
+import os
+import sys
+from array import array
+from typing import Iterator
+from clicha_scrapy.clicha_scrapy.text_writer import ARTICLE_DELIMITER, INDEX_ENTRY, \
+    INDEX_SUFFIX, TRAILER, build_index
+
+
+class CorpusReader:
+    """A memory-mapped corpus file whose articles can be accessed at random.
+
+    Article i is exactly the i-th text of f.read().split("--------") on a corpus written in a
+    single run of the TextWriter. If the offset index of the file is missing, or does not cover
+    the file exactly (for ex: it was written for a shorter or longer version of the file, or
+    only for the articles appended to it in a later run), it is rebuilt by scanning the file
+    once.
+
+    Instance Attributes:
+        - filename: the name of the corpus file
+
+    >>> with CorpusReader('clicha_scrapy/un.txt') as reader:
+    ...     reader[0].startswith('0-> ')
+    True
+    """
+    filename: str
+
+    # Private Instance Attributes:
+    #   - _mmap: the memory map of the file, or None if the file is empty
+    #   - _view: a memoryview over the memory map (or over empty bytes)
+    #   - _offsets: start0, length0, start1, length1, ... for each article in the file
+    _mmap: mmap.mmap
+    _view: memoryview
+    _offsets: array
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            if os.fstat(f.fileno()).st_size > 0:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._view = memoryview(self._mmap)
+            else:
+                self._mmap = None
+                self._view = memoryview(b'')
+        self._offsets = read_index(filename)
+        if not _covers(self._offsets, self._view):
+            self._offsets = build_index(filename)
+
+    def __len__(self) -> int:
+        """Returns the number of articles in the corpus."""
+        return len(self._offsets) // 2
+
+    def __getitem__(self, i: int) -> str:
+        """Returns the text of article i."""
+        return bytes(self.article_bytes(i)).decode('utf-8', errors='ignore')
+
+    def article_bytes(self, i: int) -> memoryview:
+        """Returns the bytes of article i as a view into the memory map, without copying."""
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('article index out of range')
+        start, length = self._offsets[2 * i], self._offsets[2 * i + 1]
+        return self._view[start: start + length]
+
+    def articles(self, start: int = 0, stop: int = -1) -> Iterator[str]:
+        """Yields the texts of the articles from index start to stop (exclusive).
+
+        if stop == -1, then all the articles from start onwards are yielded
+        """
+        if stop == -1 or stop > len(self):
+            stop = len(self)
+        for i in range(start, stop):
+            yield self[i]
+
+    def byte_range(self, start: int, stop: int) -> tuple:
+        """Returns the (first byte, end byte) of the articles from index start to stop (exclusive).
+        """
+        if start >= stop:
+            return 0, 0
+        first = self._offsets[2 * start]
+        return first, self._offsets[2 * (stop - 1)] + self._offsets[2 * stop - 1]
+
+    def shards(self, num_shards: int) -> list:
+        """Returns a list of at most num_shards (start, stop) article index ranges, covering every
+        article, such that each range spans roughly the same number of bytes.
+        """
+        total = len(self._view)
+        ranges = []
+        start = 0
+        for shard in range(1, num_shards + 1):
+            boundary = total * shard // num_shards
+            stop = start
+            while stop < len(self) and (shard == num_shards or self._offsets[2 * stop] < boundary):
+                stop += 1
+            if stop > start:
+                ranges.append((start, stop))
+            start = stop
+        return ranges
+
+    def close(self) -> None:
+        """Closes the memory map of the file."""
+        self._view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+
+    def __enter__(self) -> 'CorpusReader':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+def read_index(filename: str) -> array:
+    """Returns the offsets stored in the sidecar index of filename,
+    or an empty array if there is no index."""
+    offsets = array('Q')
+    try:
+        with open(filename + INDEX_SUFFIX, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return offsets
+    offsets.frombytes(data[:len(data) - len(data) % INDEX_ENTRY.size])
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+    return offsets
+
+
+def _covers(offsets: array, view: memoryview) -> bool:
+    """Returns whether offsets index every article of the file view is over, as build_index
+    would: the first article starts at the start of the file, each of the others right after
+    the delimiter that ends the one before, and the last one ends either at the end of the file
+    or at its last delimiter, followed by nothing but the trailer.
+    """
+    if len(offsets) == 0:
+        return len(view) == 0 or bool(TRAILER.fullmatch(view))
+    if offsets[0] != 0:
+        return False
+    if any(offsets[i] != offsets[i - 2] + offsets[i - 1] + len(ARTICLE_DELIMITER)
+           for i in range(2, len(offsets), 2)):
+        return False
+    end = offsets[-2] + offsets[-1]
+    if end == len(view):
+        return True
+    return view[end:end + len(ARTICLE_DELIMITER)] == ARTICLE_DELIMITER \
+        and bool(TRAILER.fullmatch(view[end + len(ARTICLE_DELIMITER):]))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': [
+            'mmap', 'os', 'sys', 'array', 'typing',
+            'clicha_scrapy.clicha_scrapy.text_writer', 'python_ta.contracts'
+        ],
+        'allowed-io': ['CorpusReader.__init__', 'read_index'],
+        'max-line-length': 100,
+        'max-locals': 25,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
@@ -0,0 +1,183 @@
+"""Climate Change Awareness (CliChA), Parsed Doc Cache
+
+This module provides an on-disk cache of parsed Docs, serialized with spaCy's DocBin, so that
+a repeat run over an unchanged corpus file deserializes its Docs instead of parsing them again.
+The Docs of an entry are stored and read back in segments of a bounded number of Docs, so that
+neither parsing nor reading a large corpus file ever holds all of its Docs in memory.
+
+Copyright (c) 2020 Akshat Naik and Tony Hu.
+Licensed under the MIT License. See LICENSE in the project root for license information.
+"""
+import hashlib
+import os
+import struct
+import tempfile
+from typing import BinaryIO, Callable, Iterator
+import spacy
+from spacy.tokens import DocBin
+
+
+DEFAULT_CACHE_DIR = '.doc_cache'
+# 2 GiB
+DEFAULT_MAX_BYTES = 2 << 30
+# the token attributes serialized for each Doc; the rest are derived from the vocab
+DOC_ATTRS = ["ORTH", "LEMMA", "TAG", "POS", "HEAD", "DEP", "ENT_IOB", "ENT_TYPE"]
+# the number of Docs serialized in each DocBin of an entry
+SEGMENT_DOCS = 1000
+# each segment of an entry is its byte length, as a little-endian uint64, then its DocBin
+SEGMENT_LENGTH = struct.Struct('<Q')
+# the version of the layout of the entries, part of every key so that entries written in an older
+# layout are never read (they are evicted in time instead)
+ENTRY_FORMAT = 2
+
+
+class DocCache:
+    """A content-addressed cache of parsed Docs, with least recently used eviction.
+
+    Each entry holds every Doc parsed from one corpus file, as a sequence of DocBins of up to
+    SEGMENT_DOCS Docs each. Its key covers the contents of the file, the name and version of the
+    spaCy model and the pipeline components that were enabled, so an entry can never be served
+    for a file, model or pipeline that has since changed.
+
+    Instance Attributes:
+        - directory: the directory the entries are stored in
+        - max_bytes: the maximum total size of the entries, beyond which the least recently
+          used entries are evicted
+    """
+    directory: str
+    max_bytes: int
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR,
+                 max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, filename: str, nlp: spacy.language.Language, *extra: object) -> str:
+        """Returns the key of the Docs parsed by nlp from filename.
+
+        Instance Attributes:
+            - filename: the name of the corpus file
+            - nlp: the pipeline the Docs are parsed with
+            - extra: anything else the Docs depend on (for ex: the components of nlp that were
+            run, the number of Docs parsed and the size of the chunks long texts are split into)
+        """
+        return self.key_of_hash(file_hash(filename), nlp, *extra)
+
+    def key_of_hash(self, digest: str, nlp: spacy.language.Language, *extra: object) -> str:
+        """Returns the key of the Docs parsed by nlp from the corpus file whose hash, as
+        returned by file_hash, is digest (see self.key), for callers that have hashed the file
+        already."""
+        parts = [
+            str(ENTRY_FORMAT), digest, nlp.meta.get('lang', ''), nlp.meta.get('name', ''),
+            nlp.meta.get('version', ''), spacy.__version__, ','.join(nlp.pipe_names),
+            *(str(part) for part in extra)
+        ]
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def cached_docs(self, key: str, vocab: spacy.vocab.Vocab,
+                    parse: Callable[[], Iterator[spacy.tokens.Doc]]) -> Iterator[spacy.tokens.Doc]:
+        """Yields the Docs stored under key, or the Docs returned by parse() if there are none.
+
+        In the latter case, the Docs are written to a temporary file a segment at a time as they
+        are yielded, and stored under key once all of them have been yielded. If the iteration
+        stops early, nothing is stored.
+
+        Instance Attributes:
+            - key: the key of the Docs, as returned by self.key
+            - vocab: the vocab of the pipeline the Docs were parsed with
+            - parse: a function returning an iterator of the Docs, called on a cache miss
+        """
+        path = self._path(key)
+        if os.path.exists(path):
+            # mark the entry as most recently used
+            os.utime(path)
+            with open(path, 'rb') as f:
+                for header in iter(lambda: f.read(SEGMENT_LENGTH.size), b''):
+                    doc_bin = DocBin().from_bytes(f.read(SEGMENT_LENGTH.unpack(header)[0]))
+                    yield from doc_bin.get_docs(vocab)
+            return
+        # a temporary file of its own, so that concurrent misses on the same key never write to
+        # the same file (the last one to finish replaces the others)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=key + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                doc_bin, num_docs = DocBin(attrs=DOC_ATTRS), 0
+                for doc in parse():
+                    doc_bin.add(doc)
+                    num_docs += 1
+                    yield doc
+                    if num_docs == SEGMENT_DOCS:
+                        _write_segment(f, doc_bin)
+                        doc_bin, num_docs = DocBin(attrs=DOC_ATTRS), 0
+                if num_docs > 0:
+                    _write_segment(f, doc_bin)
+            os.replace(temp_path, path)
+        except BaseException:
+            # including GeneratorExit, if the Docs were not all yielded
+            os.remove(temp_path)
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        """Removes the least recently used entries until they fit in self.max_bytes."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.spacy'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    def clear(self) -> None:
+        """Removes every entry."""
+        for name in os.listdir(self.directory):
+            if name.endswith('.spacy'):
+                os.remove(os.path.join(self.directory, name))
+
+    def _path(self, key: str) -> str:
+        """Returns the path of the entry with the given key."""
+        return os.path.join(self.directory, key + '.spacy')
+
+
+def _write_segment(f: BinaryIO, doc_bin: DocBin) -> None:
+    """Writes doc_bin to f as the next segment of an entry."""
+    data = doc_bin.to_bytes()
+    f.write(SEGMENT_LENGTH.pack(len(data)))
+    f.write(data)
+
+
+def file_hash(filename: str) -> str:
+    """Returns the SHA-256 hex digest of the contents of filename."""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': [
+            'hashlib', 'os', 'struct', 'tempfile', 'typing', 'spacy', 'spacy.tokens',
+            'python_ta.contracts'
+        ],
+        'allowed-io': ['DocCache.cached_docs', '_write_segment', 'file_hash'],
+        'max-line-length': 100,
+        'max-locals': 25,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
@@ -6,82 +6,330 @@ and the number of articles that test "climate-change aware."
 Copyright (c) 2020 Akshat Naik and Tony Hu.
 Licensed under the MIT License. See LICENSE in the project root for license information.
 """
+import argparse
 import csv
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterable, Optional, Union
+import numpy
 import spaCy_helpers as sh
-from find_climate_keywords import create_idf_dict
+import resources
+from atomic_file import write_atomically
+from corpus_reader import CorpusReader
+from doc_cache import DocCache, file_hash
+from idf_store import IdfStore
+from keyword_weights import KeywordWeights
+from resources import IDF_FILE, KEYWORDS_FILE
+from results_db import ResultsDatabase
+from results_store import ResultsStore, read_processed_data
+from run_manifest import RunManifest
 
 
-with open('climate_keywords/keywords.txt') as h:
-    KEYWORDS = h.read().split('\n')
+# the number of articles assumed for a year whose corpus file is not available (for ex: when
+# only the processed data was downloaded)
+DEFAULT_ARTICLE_TOTAL = 1500
+
+# the default number of bytes a batch of articles may take while it is parsed (see
+# spaCy_helpers.pipe)
+DEFAULT_MEMORY_BUDGET = 256 * 2 ** 20
+
+# The keyword weights, matcher, attribute, DocCache, prefilter and memory budget of a worker
+# process of articles_process_yearly, loaded once by _init_worker when the worker starts.
+_worker_state = {}
 
 
 def articles_process_yearly(dataset_name: str, year_start: int, year_end: int,
-                            attribute: str = "LOWER") -> None:
+                            attribute: str = "LOWER", use_cache: bool = True,
+                            jobs: int = 1, resume: bool = True,
+                            database: Optional[str] = None, fused: bool = False,
+                            prefilter: bool = True,
+                            memory_budget: Optional[int] = DEFAULT_MEMORY_BUDGET) -> dict:
     """Processes dataset_name articles and writes a report for each year separately from year_start
     to year_end (both inclusive) in climate_data/{dataset_name}_processed_data.
 
+    Returns a dict mapping each year processed to a dict of its statistics:
+        - 'pruned': the number of its articles pruned by the prefilter
+        - 'peak_rss': the peak resident set size, in bytes, of the process that processed it,
+        once it was processed (None if it cannot be measured on this platform)
+
     Instance Attributes:
         - dataset_name: the name of the dataset (for ex: 'nytimes', 'science_daily_small')
         - year_start: the year to start processing from
         - year_end: the year to end processing on
         - attribute: the attribute to be passed to the function phrase_matcher
-        Useful options for attribute are 'LOWER' and 'LEMMA'
+        Useful options for attribute are 'LOWER', 'LEMMA' and 'LEMMA_LOOKUP'
+        - use_cache: bool indicating whether to read and store the parsed articles in a DocCache,
+        so that processing the same year again does not parse it again
+        - jobs: the number of processes the years are spread across.
+        Each process loads the spaCy model and the matcher once and writes its own years. The
+        reports written are the same as with jobs == 1.
+        - resume: bool indicating whether to skip the years that were already processed.
+        Each completed year is recorded in climate_data/{dataset_name}_processed_data/manifest.json
+        along with the hash of its input file, the hash of the keyword list, the hash of the
+        idfs the CAIs are computed with (IDF_FILE) and the attribute. A year is skipped only if
+        all of them are unchanged, so after a crash a run picks up where it stopped, and a later
+        run reprocesses only the years whose input actually changed, or all of them once the
+        idfs are recomputed (for ex: by find_climate_keywords.update_idf_tstar).
+        - database: the path of a ResultsDatabase (see results_db) to also store the results of
+        each year in, if any. The results of a year replace any stored for it before.
+        - fused: bool indicating whether to also write the report of articles_process (with its
+        default thresholds) for the years from year_start to year_end, without a second pass over
+        the results. The row of each year is computed in memory as soon as the year is processed,
+        and the report is rewritten each time with the years done so far, in order of year, so it
+        can be followed while a long run is still going.
+        - prefilter: bool indicating whether to scan the raw text of each article for the
+        keywords first (see spaCy_helpers.keyword_prefilter), and record the articles in which
+        none can occur as having no match without tokenizing them. The reports are the same
+        either way. Only the 'LOWER' attribute has a prefilter.
+        - memory_budget: the number of bytes a batch of articles may take while it is parsed.
+        The batches are sized by the length of their articles to fit in it, and each Doc is
+        released as soon as its matches are counted, so that even the 'LEMMA' attribute can
+        process a large year in little memory. If None, the articles are parsed 100 at a time.
 
     For each row in {year}.txt in climate_data/{dataset_name}_processed_data,
     row[0] is the index of the article
     row[1] is the number of distinct keywords matched in that article
     row[2] is the total number of keywords matched in that article
-    row[3] is a list of (keyword, number of times keyword occurred) pairs of that article
+    row[3] is the Climate Awareness Index of that article
+    row[4] is a list of (keyword, number of times keyword occurred) pairs of that article
+    The same results are also stored as columns in the ResultsStore of dataset_name (see
+    results_store).
 
     CAUTION: Passing 'LEMMA' as the attribute on the entirety of one of the datasets will cause the
     function to process for many hours (perhaps a day), and may even terminate in case RAM is
     overloaded and/or has limited capacity.
     In comparison, passing 'LOWER' as the attribute on the entirety of one of the datasets will
-    cause the function to complete within an hour or two.
+    cause the function to complete within an hour or two. Passing 'LEMMA_LOOKUP' gives results
+    close to 'LEMMA' in about the time of 'LOWER', since it lemmatizes with the lookup table
+    instead of the tagger.
+    """
+    manifest = RunManifest(f'climate_data/{dataset_name}_processed_data/manifest.json')
+    keywords_hash = file_hash(KEYWORDS_FILE)
+    # load the idfs (rewriting IDF_FILE and the binary idf store from the document frequencies,
+    # if they are stale) here, once, before they are hashed, and instead of in every worker at
+    # the same time
+    resources.idf_dict()
+    idf_hash = file_hash(IDF_FILE)
+    entries = {}
+    for year in range(year_start, year_end + 1):
+        entry = {
+            'input_hash': file_hash(f"clicha_scrapy/{dataset_name}/{year}.txt"),
+            'keywords_hash': keywords_hash,
+            'idf_hash': idf_hash,
+            'attribute': attribute
+        }
+        if database is not None:
+            # a year is not complete until it is stored in this database as well
+            entry['database'] = os.path.abspath(database)
+        output = f'climate_data/{dataset_name}_processed_data/{year}.txt'
+        if not (resume and manifest.is_complete(year, entry) and os.path.exists(output)):
+            entries[year] = entry
+    db = ResultsDatabase(database) if database is not None else None
+    summary = None
+    if fused:
+        # the years skipped are not processed again, so their rows are read back instead
+        summary = {year: aggregate_yearly(dataset_name, year, year)[0]
+                   for year in range(year_start, year_end + 1) if year not in entries}
+        write_summary(dataset_name, summary.values())
+    stats = {}
+    if jobs > 1:
+        with ProcessPoolExecutor(jobs, initializer=_init_worker,
+                                 initargs=(attribute, use_cache, prefilter,
+                                           memory_budget)) as executor:
+            futures = {executor.submit(_process_year_in_worker, dataset_name, year): year
+                       for year in entries}
+            for future in as_completed(futures):
+                year = futures[future]
+                # only this process writes to the database and the report, as the years come in
+                result = future.result()
+                _finish_year(dataset_name, year, result, db, summary)
+                manifest.mark_complete(year, entries[year])
+                stats[year] = {'pruned': result[2], 'peak_rss': result[3]}
+    else:
+        keyword_weights = resources.keyword_weights()
+        matcher = resources.matcher(attribute)
+        cache = DocCache() if use_cache else None
+        pattern = _prefilter(attribute, prefilter)
+        for year, entry in entries.items():
+            result = _process_year(dataset_name, year, matcher, keyword_weights, attribute, cache,
+                                   pattern, memory_budget)
+            _finish_year(dataset_name, year, result, db, summary)
+            manifest.mark_complete(year, entry)
+            stats[year] = {'pruned': result[2], 'peak_rss': result[3]}
+    if db is not None:
+        db.close()
+    return dict(sorted(stats.items()))
+
+
+def _process_year(dataset_name: str, year: int, matcher: object,
+                  keyword_weights: KeywordWeights, attribute: str,
+                  cache: Optional[DocCache], prefilter: Optional[re.Pattern] = None,
+                  memory_budget: Optional[int] = None) -> tuple:
+    """Processes the dataset_name articles of year and writes its report in
+    climate_data/{dataset_name}_processed_data/{year}.txt, as described in
+    articles_process_yearly, with the matcher returned by phrase_matcher and the pattern
+    returned by keyword_prefilter, if any. The CAIs of the articles with matches are computed
+    together once they have all been matched.
+
+    Returns a tuple of the rows of the report, the number of articles in year, the number of
+    articles pruned by the prefilter and the peak resident set size of this process.
+    """
+    filename = f"clicha_scrapy/{dataset_name}/{year}.txt"
+    # the prefilter scans each article as it is read for parsing, and only the articles that
+    # pass it are yielded, along with their index
+    docs = sh.iter_doc_from_text(filename, cache=cache, prefilter=prefilter,
+                                 memory_budget=memory_budget, with_indices=True,
+                                 **sh.doc_options(attribute))
+    articles_with_matches = []
+    lengths = []
+    num_scanned = 0
+    for i, doc in docs:
+        num_scanned += 1
+        total_matches, distinct_matches, counter_items = sh.phrase_matching(doc, matcher)
+        if distinct_matches > 0:
+            articles_with_matches.append(
+                [i, distinct_matches, total_matches, None, counter_items]
+            )
+            lengths.append(len(doc))
+    article_cais = keyword_weights.score_batch([row[4] for row in articles_with_matches], lengths)
+    for row, article_cai in zip(articles_with_matches, article_cais):
+        row[3] = article_cai
+    articles_with_matches.sort(key=lambda x: x[1], reverse=True)
+    output = f'climate_data/{dataset_name}_processed_data/{year}.txt'
+    # write to a temporary file first so that a crash never leaves a half-written report
+    write_atomically(output, 'w', lambda f: csv.writer(f).writerows(articles_with_matches))
+    with CorpusReader(filename) as reader:
+        num_articles = len(reader)
+    num_pruned = max(num_articles - num_scanned, 0) if prefilter is not None else 0
+    results_store(dataset_name).write_year(year, articles_with_matches, num_articles)
+    return articles_with_matches, num_articles, num_pruned, sh.peak_rss()
+
+
+def _finish_year(dataset_name: str, year: int, result: tuple, db: Optional[ResultsDatabase],
+                 summary: Optional[dict]) -> None:
+    """Stores the result of processing year, as returned by _process_year, in db, and adds
+    its row to summary (a dict mapping each year to its row of the report of articles_process)
+    and rewrites the report, if they are not None."""
+    rows, num_articles = result[:2]
+    if db is not None:
+        db.upsert_year(dataset_name, year, rows, num_articles)
+    if summary is not None:
+        summary[year] = summarize_years(
+            [year], [len(rows)], *(numpy.array([row[i] for row in rows], dtype=numpy.float64)
+                                   for i in (1, 2, 3)), [num_articles]
+        )[0]
+        write_summary(dataset_name, (summary[year] for year in sorted(summary)))
+
+
+def results_store(dataset_name: str) -> ResultsStore:
+    """Returns the ResultsStore of the per-article results of dataset_name, in
+    climate_data/{dataset_name}_results."""
+    return ResultsStore(f'climate_data/{dataset_name}_results')
+
+
+def import_processed_data(dataset_name: str, year_start: int, year_end: int,
+                          database: Optional[str] = None) -> None:
+    """Stores in the ResultsStore of dataset_name (and in the ResultsDatabase at database, if
+    any) the results of each year from year_start to year_end (both inclusive) read from
+    climate_data/{dataset_name}_processed_data, for the years that were processed before the
+    ResultsStore existed.
+
+    The number of articles of a year is taken from its corpus file, if it is there.
     """
-    idf_dict = create_idf_dict()
-    matcher = sh.phrase_matcher(KEYWORDS, attribute)
+    store = results_store(dataset_name)
+    db = ResultsDatabase(database) if database is not None else None
     for year in range(year_start, year_end + 1):
         filename = f"clicha_scrapy/{dataset_name}/{year}.txt"
-        if attribute != "LOWER":
-            docs = sh.list_doc_from_text(filename, tagging=True)
-        else:
-            docs = sh.list_doc_from_text(filename)
-        articles_with_matches = []
-        for i, doc in enumerate(docs):
-            total_matches, distinct_matches, counter_items = sh.phrase_matching(doc, matcher)
-            article_cai = article_climate_awareness_index(counter_items, idf_dict, len(doc))
-            if distinct_matches > 0:
-                articles_with_matches.append(
-                    [i, distinct_matches, total_matches, article_cai, counter_items]
-                )
-        articles_with_matches.sort(key=lambda x: x[1], reverse=True)
-        with open(f'climate_data/{dataset_name}_processed_data/{year}.txt', 'w') as f:
-            writer = csv.writer(f)
-            writer.writerows(articles_with_matches)
-
-
-def article_climate_awareness_index(matches: list, idf_dict: dict, length_of_doc: int) -> float:
+        num_articles = None
+        if os.path.exists(filename):
+            with CorpusReader(filename) as reader:
+                num_articles = len(reader)
+        rows = read_processed_data(f'climate_data/{dataset_name}_processed_data/{year}.txt')
+        store.write_year(year, rows, num_articles)
+        if db is not None:
+            db.upsert_year(dataset_name, year, rows, num_articles)
+    if db is not None:
+        db.close()
+
+
+def _init_worker(attribute: str, use_cache: bool, prefilter: bool,
+                 memory_budget: Optional[int]) -> None:
+    """Loads the keyword weights, the matcher, the prefilter and the DocCache of a worker
+    process of articles_process_yearly, once per worker."""
+    _worker_state['keyword_weights'] = resources.keyword_weights()
+    _worker_state['matcher'] = resources.matcher(attribute)
+    _worker_state['attribute'] = attribute
+    _worker_state['cache'] = DocCache() if use_cache else None
+    _worker_state['prefilter'] = _prefilter(attribute, prefilter)
+    _worker_state['memory_budget'] = memory_budget
+
+
+def _prefilter(attribute: str, prefilter: bool) -> Optional[re.Pattern]:
+    """Returns the prefilter pattern articles_process_yearly processes the years with, if any."""
+    if not prefilter:
+        return None
+    return resources.prefilter(attribute)
+
+
+def _process_year_in_worker(dataset_name: str, year: int) -> tuple:
+    """Processes the dataset_name articles of year in a worker process set up by _init_worker,
+    and returns what _process_year returns."""
+    return _process_year(dataset_name, year, _worker_state['matcher'],
+                         _worker_state['keyword_weights'], _worker_state['attribute'],
+                         _worker_state['cache'],
+                         _worker_state['prefilter'], _worker_state['memory_budget'])
+
+
+def score_article(dataset_name: str, year: int, index: int, attribute: str = "LOWER") -> list:
+    """Returns [index, distinct matches, total matches, CAI, (keyword, count) pairs] of the
+    article at index in clicha_scrapy/{dataset_name}/{year}.txt, i.e. a single row of
+    climate_data/{dataset_name}_processed_data/{year}.txt, without reading the other articles.
+
+    Instance Attributes:
+        - dataset_name: the name of the dataset (for ex: 'nytimes', 'science_daily_small')
+        - year: the year of the article
+        - index: the index of the article in its year
+        - attribute: the attribute to be passed to the function phrase_matcher
+    """
+    with CorpusReader(f"clicha_scrapy/{dataset_name}/{year}.txt") as reader:
+        text = reader[index]
+    doc, = sh.iter_docs([text], **sh.doc_options(attribute))
+    total_matches, distinct_matches, counter_items = \
+        sh.phrase_matching(doc, resources.matcher(attribute))
+    article_cai = resources.keyword_weights().score(counter_items, len(doc))
+    return [index, distinct_matches, total_matches, article_cai, counter_items]
+
+
+def article_climate_awareness_index(matches: list,
+                                    idf_dict: Union[dict, IdfStore, KeywordWeights],
+                                    length_of_doc: int) -> float:
     """Returns a numeric estimate of how climate aware a Doc is.
     A Doc (a sequence of Tokens) is a class in spaCy.
 
+    The CAI is the sum of the idf of each word matched times the number of times it occurred
+    (with 10 as the idf of the words that have none), divided by the length of the Doc.
+    Prefer passing a KeywordWeights (for ex: resources.keyword_weights()), which looks up the
+    idf of each word only once, and KeywordWeights.score_batch to score many Docs at once. A
+    word the KeywordWeights was not compiled with has the weight of a word with no idf.
+
     Instance Attributes:
         - matches: a list of tuples consisting of a word and the number of times it occurred
-        - idf_dict: an idf (Inverse Document Frequency) dict
+        - idf_dict: an idf (Inverse Document Frequency) dict, an IdfStore or a KeywordWeights
         - length_of_doc: the length of the given Doc (an article can be a Doc)
+
+    >>> article_climate_awareness_index([('ice', 4), ('melt', 1)], {'ice': 0.5}, 100)
+    0.12
     """
-    article_cai = 0
-    for word, count in matches:
-        if word in idf_dict:
-            article_cai += idf_dict[word] * count
-        else:
-            article_cai += 10 * count
-    if length_of_doc == 0:
-        length_of_doc = 1
-    return round(article_cai / length_of_doc, 5)
+    if not isinstance(idf_dict, KeywordWeights):
+        idf_dict = KeywordWeights(idf_dict, (word for word, _ in matches))
+    return idf_dict.score(matches, length_of_doc)
 
 
-def articles_process(dataset_name: str, year_start: int, year_end: int) -> None:
+def articles_process(dataset_name: str, year_start: int, year_end: int,
+                     database: Optional[str] = None, min_distinct: int = 8, min_total: int = 15,
+                     min_cai: float = 0.02, cai_min_distinct: int = 5) -> None:
     """Prepares a cumulative report about climate_change for all the years from year_start
     to year_end (both inclusive) on a given dataset, in a csv file.
 
@@ -89,42 +337,183 @@ def articles_process(dataset_name: str, year_start: int, year_end: int) -> None:
         - dataset_name: the name of the dataset (for ex: 'nytimes', 'science_daily_small')
         - year_start: the year to start processing from
         - year_end: the year to end processing on
+        - database: the path of a ResultsDatabase to aggregate the results of the years from
+        with SQL, if any. Only the years stored in it are reported.
+        - min_distinct, min_total, min_cai: the thresholds an article must meet to test
+        climate-change positive (see test_climate_aware)
+        - cai_min_distinct: the number of distinct keywords an article must have for its CAI to
+        count towards the CAI of its year
 
     For each row in the csv file,
     row[0] is the year
     row[1] is the number of articles which tested climate-change positive
     row[2] is the Climate Awareness Index of that year
     row[3] is the total number of articles processed for that year
+
+    Without a database, the results of the years are aggregated by aggregate_yearly.
     """
-    with open(f'climate_data/{dataset_name}_climate_change_data.txt', 'w') as f:
-        writer = csv.writer(f)
-        for year in range(year_start, year_end + 1):
+    if database is not None:
+        with ResultsDatabase(database) as db:
+            summary = db.yearly_summary(dataset_name, year_start, year_end, min_distinct,
+                                        min_total, min_cai, cai_min_distinct)
+        rows = [[year, count_climate_change, year_cai,
+                 num_articles if num_articles is not None else article_total(dataset_name, year)]
+                for year, count_climate_change, year_cai, num_articles in summary]
+    else:
+        rows = aggregate_yearly(dataset_name, year_start, year_end, min_distinct, min_total,
+                                min_cai, cai_min_distinct)
+    write_summary(dataset_name, rows)
+
+
+def write_summary(dataset_name: str, rows: Iterable[list]) -> None:
+    """Writes rows as the report of articles_process in
+    climate_data/{dataset_name}_climate_change_data.txt."""
+    output = f'climate_data/{dataset_name}_climate_change_data.txt'
+    # the report may be read (for ex: by the GUI) while a fused run is rewriting it
+    write_atomically(output, 'w', lambda f: csv.writer(f).writerows(rows))
+
+
+def aggregate_yearly(dataset_name: str, year_start: int, year_end: int, min_distinct: int = 8,
+                     min_total: int = 15, min_cai: float = 0.02,
+                     cai_min_distinct: int = 5) -> list:
+    """Returns the rows of the report written by articles_process (with the same arguments),
+    computed over all the years at once.
+
+    The distinct matches, total matches and CAI of every article of every year are loaded into
+    a single array each, from the ResultsStore of dataset_name, or from
+    climate_data/{dataset_name}_processed_data for the years that are not in it. The yearly
+    figures are then computed as array operations rather than article by article.
+    """
+    store = results_store(dataset_name)
+    years = list(range(year_start, year_end + 1))
+    distinct, total, cai, lengths, totals = [], [], [], [], []
+    for year in years:
+        if store.has_year(year):
+            # only the three columns needed are read
+            columns = store.load_year(year, ['distinct', 'total', 'cai'])
+            num_articles = store.num_articles(year)
+        else:
             filename = f"climate_data/{dataset_name}_processed_data/{year}.txt"
             with open(filename, 'r') as f:
-                data = f.readlines()
-            climate_change_yearly = []
-            count_climate_change = 0
-            year_cai = 0
-            for row in data:
-                row_processed = [float(ele) for ele in row.split(',', maxsplit=4)[1:4]]
-                distinct_keywords, total_keywords, article_cai = row_processed
-                if test_climate_aware(distinct_keywords, total_keywords, article_cai):
-                    count_climate_change += 1
-                if distinct_keywords >= 5:
-                    year_cai += article_cai
-            climate_change_yearly.append([year, count_climate_change, year_cai, 1500])
-            writer.writerows(climate_change_yearly)
-
-
-def test_climate_aware(distinct_keywords: float, total_keywords: float, article_cai: float) -> bool:
-    """Returns whether an article with given parameters is climate aware or not."""
-    return distinct_keywords >= 8 and total_keywords >= 15 and article_cai >= 0.02
-
-
-if __name__ == "__main__":
+                values = numpy.array([row.split(',', maxsplit=4)[1:4] for row in f],
+                                     dtype=numpy.float64).reshape(-1, 3)
+            columns = {'distinct': values[:, 0], 'total': values[:, 1], 'cai': values[:, 2]}
+            num_articles = None
+        distinct.append(columns['distinct'])
+        total.append(columns['total'])
+        cai.append(columns['cai'])
+        lengths.append(len(columns['cai']))
+        totals.append(num_articles if num_articles is not None
+                      else article_total(dataset_name, year))
+    return summarize_years(years, lengths, *(numpy.concatenate(column + [numpy.zeros(0)])
+                                             for column in (distinct, total, cai)),
+                           totals, min_distinct, min_total, min_cai, cai_min_distinct)
+
+
+def summarize_years(years: list, lengths: list, distinct: numpy.ndarray, total: numpy.ndarray,
+                    cai: numpy.ndarray, totals: list, min_distinct: int = 8, min_total: int = 15,
+                    min_cai: float = 0.02, cai_min_distinct: int = 5) -> list:
+    """Returns the rows of the report written by articles_process for years.
+
+    Instance Attributes:
+        - years: the years
+        - lengths: the number of articles with matches in each year
+        - distinct, total, cai: the distinct matches, total matches and CAI of the articles with
+        matches of all the years, one year after another, each in the order of its processed
+        data file
+        - totals: the number of articles processed in each year
+        - min_distinct, min_total, min_cai, cai_min_distinct: as in articles_process
+    """
+    year_of_row = numpy.repeat(numpy.arange(len(years)), lengths)
+    aware = test_climate_aware(distinct, total, cai, min_distinct, min_total, min_cai)
+    counts = numpy.bincount(year_of_row, weights=aware, minlength=len(years))
+    counted = distinct >= cai_min_distinct
+    # bincount adds up the CAIs of each year in order, just as a running sum would
+    year_cais = numpy.bincount(year_of_row, weights=numpy.where(counted, cai, 0),
+                               minlength=len(years))
+    # a year in which no CAI is counted has a CAI of 0, not 0.0, as it always had
+    has_cai = numpy.bincount(year_of_row, weights=counted, minlength=len(years)) > 0
+    return [[year, int(count), year_cai if counted_any else 0, num_articles]
+            for year, count, year_cai, counted_any, num_articles in
+            zip(years, counts.tolist(), year_cais.tolist(), has_cai.tolist(), totals)]
+
+
+def article_total(dataset_name: str, year: int) -> int:
+    """Returns the number of articles of dataset_name in year, counted from the index of its
+    corpus file, or DEFAULT_ARTICLE_TOTAL if the corpus file is not there."""
+    filename = f"clicha_scrapy/{dataset_name}/{year}.txt"
+    if not os.path.exists(filename):
+        return DEFAULT_ARTICLE_TOTAL
+    with CorpusReader(filename) as reader:
+        return len(reader)
+
+
+def test_climate_aware(distinct_keywords: Union[float, numpy.ndarray],
+                       total_keywords: Union[float, numpy.ndarray],
+                       article_cai: Union[float, numpy.ndarray], min_distinct: int = 8,
+                       min_total: int = 15, min_cai: float = 0.02) -> Union[bool, numpy.ndarray]:
+    """Returns whether an article with given parameters is climate aware or not.
+
+    Given arrays of the parameters of many articles instead, returns an array of whether each
+    of them is climate aware or not.
+
+    >>> test_climate_aware(8, 20, 0.03)
+    True
+    >>> test_climate_aware(numpy.array([8, 7]), numpy.array([20, 20]), 0.03).tolist()
+    [True, False]
+    """
+    return (distinct_keywords >= min_distinct) & (total_keywords >= min_total) \
+        & (article_cai >= min_cai)
+
+
+def main(argv: Optional[list] = None) -> None:
+    """Processes a dataset from the command line, for ex:
+
+    python find_climate_articles.py nytimes 1851 2020 --jobs 4
+    """
+    parser = argparse.ArgumentParser(description="Processes the articles of a dataset.")
+    parser.add_argument('dataset_name', help="for ex: 'nytimes', 'science_daily_small'")
+    parser.add_argument('year_start', type=int)
+    parser.add_argument('year_end', type=int)
+    parser.add_argument('--attribute', default="LOWER",
+                        help="'LOWER', 'LEMMA' or 'LEMMA_LOOKUP'")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="the number of processes the years are spread across")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="do not read or store the parsed articles in a DocCache")
+    parser.add_argument('--no-resume', action='store_true',
+                        help="process every year, even those already processed")
+    parser.add_argument('--database', help="the path of an SQLite database to also store "
+                                           "the results in and aggregate them from")
+    parser.add_argument('--fused', action='store_true',
+                        help="write the yearly summary as the years are processed, instead of "
+                             "reading the results back afterwards")
+    parser.add_argument('--no-prefilter', action='store_true',
+                        help="tokenize every article, even those in which no keyword can occur")
+    parser.add_argument('--memory-budget', type=int, default=DEFAULT_MEMORY_BUDGET // 2 ** 20,
+                        help="the number of megabytes a batch of articles may take while it is "
+                             "parsed")
+    args = parser.parse_args(argv)
+    stats = articles_process_yearly(args.dataset_name, args.year_start, args.year_end,
+                                    args.attribute, not args.no_cache, args.jobs,
+                                    not args.no_resume, args.database, args.fused,
+                                    not args.no_prefilter, args.memory_budget * 2 ** 20)
+    for year, year_stats in stats.items():
+        peak_rss = year_stats['peak_rss']
+        print(f"{year}: {year_stats['pruned']} articles pruned by the prefilter, peak RSS "
+              + ("unknown" if peak_rss is None else f"{peak_rss / 2 ** 20:.0f} MB"))
+    if not args.fused:
+        articles_process(args.dataset_name, args.year_start, args.year_end, args.database)
+
+
+if __name__ == "__main__" and len(sys.argv) > 1:
+    main()
+elif __name__ == "__main__":
     # Sample Usage (for nytimes):
     # articles_process_yearly("nytimes", 1851, 2020)
     # articles_process("nytimes", 1851, 2020)
+    # or from the command line, spreading the years across 4 processes:
+    # python find_climate_articles.py nytimes 1851 2020 --jobs 4
     #
     # WARNING: The above code may take more than hour to process and with the LEMMA attribute,
     # it may take an entire day.
@@ -138,8 +527,17 @@ if __name__ == "__main__":
 
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['spaCy_helpers', 'find_climate_keywords', 'csv', 'python_ta.contracts'],
-        'allowed-io': ['articles_process_yearly', 'articles_process', 'test_climate_aware'],
+        'extra-imports': [
+            'spaCy_helpers', 'resources', 'atomic_file', 'corpus_reader', 'doc_cache',
+            'run_manifest',
+            'keyword_weights', 'idf_store', 'results_db', 'results_store',
+            'argparse', 'csv', 'os', 're', 'sys', 'concurrent.futures', 'typing',
+            'numpy',
+            'python_ta.contracts'
+        ],
+        'allowed-io': [
+            '_process_year', 'aggregate_yearly', 'write_summary', 'test_climate_aware', 'main'
+        ],
         'max-line-length': 100,
         'max-locals': 25,
         # E9997: The h when using 'with open(...) as h' is a lowercase letter by convention.
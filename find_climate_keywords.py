@@ -7,62 +7,235 @@ Copyright (c) 2020 Akshat Naik and Tony Hu.
 Licensed under the MIT License. See LICENSE in the project root for license information.
 """
 import csv
-from collections import defaultdict
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Optional
 import spaCy_helpers as sh
+import resources
+from corpus_reader import CorpusReader
+from doc_cache import DocCache, file_hash
+from idf_store import IdfStore, load_idf_store, write_idf_csv, write_idf_store
+from resources import DF_FILE, IDF_FILE, IDF_STORE_FILE
+from tfidf_engine import DocumentFrequencyCounter, TermDocumentMatrix
 
 
-def find_idf_tstar() -> None:
+# the number of bytes of articles in each shard find_possible_keywords splits a file into. It
+# does not depend on the number of processes, so the shards (and so the keys of their cached
+# Docs) are the same whatever the number of processes, and it is small enough that a process
+# given a shard of slow articles does not hold up the others for long
+SHARD_BYTES = 4 << 20
+# the number of docs whose tf-idfs are computed together in find_possible_keywords
+DOCS_PER_MATRIX = 1000
+
+
+def find_idf_tstar(use_cache: bool = True, checkpoint: Optional[str] = None) -> None:
     """Writes in climate_keywords/tstar_idf.txt each term and the idf of the term found in
-    clicha_scrapy/tstar.txt"""
-    docs = sh.list_doc_from_text('clicha_scrapy/tstar.txt')
-    tf_dicts = [sh.term_frequency_dict(doc) for doc in docs]
-    idf_dict = sh.inverse_document_frequency_dict(tf_dicts)
-    with open("climate_keywords/tstar_idf.txt", "w") as f:
-        writer = csv.writer(f)
-        for key, val in idf_dict.items():
-            writer.writerow([key, val])
+    clicha_scrapy/tstar.txt, and writes the same idfs in binary form in tstar_idf.bin
 
+    The document frequencies are accumulated one article at a time. If a checkpoint is given,
+    they are saved to it every so often, and a later call with the same checkpoint carries on
+    from the last article saved instead of starting over. Once all articles are counted, the
+    document frequencies are saved to climate_keywords/tstar_df.json, so that the articles
+    appended to tstar.txt later can be added by update_idf_tstar. The articles are those of the
+    CorpusReader of tstar.txt, as in update_idf_tstar, so the trailing 'Articles crawled: N' text
+    is not counted as a document.
 
-def create_idf_dict() -> dict:
-    """Returns the idf_dict from tstar_idf.txt"""
-    with open("climate_keywords/tstar_idf.txt", "r", encoding='utf-8', errors='ignore') as f:
-        reader = csv.reader(f)
-        idf_dict = {}
-        for term, idf in reader:
-            idf_dict[term] = float(idf)
-    return idf_dict
+    Instance Attributes:
+        - use_cache: bool indicating whether to read and store the parsed articles in a DocCache
+        - checkpoint: the path to save the partial document frequencies to, if any
+        (for ex: 'climate_keywords/tstar_df.json')
+    """
+    filename = 'clicha_scrapy/tstar.txt'
+    if checkpoint is not None and os.path.exists(checkpoint):
+        counter = DocumentFrequencyCounter.load(checkpoint)
+    else:
+        counter = DocumentFrequencyCounter()
+    with CorpusReader(filename) as reader:
+        if counter.num_docs:
+            # skip the articles already counted without parsing them again
+            docs = sh.iter_docs(reader.articles(counter.num_docs))
+        elif use_cache:
+            cache = DocCache()
+            docs = cache.cached_docs(
+                cache.key(filename, sh.get_nlp(), (), 0, len(reader), sh.MAX_CHUNK_CHARS),
+                sh.get_nlp().vocab,
+                lambda: sh.iter_docs(reader.articles())
+            )
+        else:
+            docs = sh.iter_docs(reader.articles())
+        counter.update((sh.term_counts(doc) for doc in docs), checkpoint)
+        counter.offset = reader.byte_range(0, len(reader))[1]
+    counter.save(DF_FILE)
+    idf_dict = counter.idf_dict()
+    write_idf_csv(IDF_FILE, idf_dict)
+    write_idf_store(IDF_STORE_FILE, idf_dict)
+
+
+def update_idf_tstar(tolerance: float = 1e-3) -> dict:
+    """Adds the articles appended to clicha_scrapy/tstar.txt since its document frequencies were
+    last saved to climate_keywords/tstar_df.json, and returns a dict mapping each keyword whose
+    idf moved by more than tolerance to a tuple of its old and new idf (None if it had none).
+
+    The new articles are those after the number of articles counted so far, since articles are
+    only ever appended. Only they are parsed, so the work done is proportional to their number
+    rather than to the size of tstar.txt. The idfs themselves are not written here:
+    tstar_idf.txt and tstar_idf.bin are recomputed from the updated document frequencies the
+    next time they are loaded (see resources.idf_dict). If tstar_df.json does not exist yet,
+    every article is added.
+
+    A ValueError is raised if the articles counted in tstar_df.json do not end exactly where its
+    saved offset says they do, i.e. if tstar.txt was changed other than by appending to it.
+
+    Instance Attributes:
+        - tolerance: the smallest change in the idf of a keyword that is reported
+    """
+    filename = 'clicha_scrapy/tstar.txt'
+    if os.path.exists(DF_FILE):
+        counter = DocumentFrequencyCounter.load(DF_FILE)
+    else:
+        counter = DocumentFrequencyCounter()
+    keywords = [keyword for keyword in resources.keywords() if keyword]
+    old_idfs = {keyword: counter.idf(keyword) for keyword in keywords}
+    with CorpusReader(filename) as reader:
+        start = counter.num_docs
+        if start > len(reader) or reader.byte_range(0, start)[1] != counter.offset:
+            raise ValueError(f'The articles counted in {DF_FILE} are not the first {start} '
+                             f'articles of {filename}')
+        counter.update(sh.term_counts(doc) for doc in sh.iter_docs(reader.articles(start)))
+        counter.offset = reader.byte_range(0, len(reader))[1]
+    counter.save(DF_FILE)
+    moved = {}
+    for keyword, old_idf in old_idfs.items():
+        new_idf = counter.idf(keyword)
+        if old_idf is None or new_idf is None:
+            if old_idf != new_idf:
+                moved[keyword] = (old_idf, new_idf)
+        elif abs(new_idf - old_idf) > tolerance:
+            moved[keyword] = (old_idf, new_idf)
+    return moved
+
+
+def create_idf_dict() -> IdfStore:
+    """Returns the idf_dict from tstar_idf.txt, as a memory-mapped IdfStore.
+
+    The IdfStore is read from climate_keywords/tstar_idf.bin, which is first (re)built from
+    tstar_idf.txt if it is missing or older than it.
+    Prefer resources.idf_dict, which only opens it once per process.
+    """
+    return load_idf_store(IDF_FILE, IDF_STORE_FILE, DF_FILE)
 
 
-def find_possible_keywords(files: list) -> None:
+def find_possible_keywords(files: list, use_cache: bool = True, jobs: int = 1,
+                           top_n: Optional[int] = None) -> None:
     """Writes in climate_keywords/{filename}_keywords.txt rows of 3 comma-separated values.
-    Each row consists of term, average tf-idf of term, number of times it occured in each doc."""
-    idf_dict = create_idf_dict()
-    combined_filename, docs = _docs_from_climate_files(files)
-    tf_idf_dicts = [sh.tf_idf_dict(sh.term_frequency_dict(doc), idf_dict) for doc in docs]
-    final_dict = defaultdict(lambda: [0, 0])
-    for tf_idf_dict in tf_idf_dicts:
-        for term, val in tf_idf_dict.items():
-            final_dict[term] = [final_dict[term][0] + val, final_dict[term][1] + 1]
+    Each row consists of term, average tf-idf of term, number of times it occured in each doc.
+
+    The articles are split into shards of roughly SHARD_BYTES each, which are mapped to partial
+    (sum of tf-idfs, number of docs) aggregates of each term by up to jobs processes, each
+    streaming the docs of its shard. The partial aggregates are then reduced into the final
+    ones, so neither the docs nor their tf-idf dicts are ever all kept in memory.
+
+    Instance Attributes:
+        - files: the names of the climate change files in clicha_scrapy
+        - use_cache: bool indicating whether to read and store the parsed articles of each shard
+        in a DocCache
+        - jobs: the number of processes the shards are spread across
+        - top_n: the number of terms to write, picked with a bounded heap.
+        if top_n is None, then every term is written
+    """
+    combined_filename = "".join(filename + "_" for filename in files)
+    shards = []
+    for filename in files:
+        with CorpusReader(f'clicha_scrapy/{filename}.txt') as reader:
+            num_shards = max(-(-os.path.getsize(reader.filename) // SHARD_BYTES), 1)
+            # each file is hashed once here, instead of once for each of its shards
+            digest = file_hash(reader.filename) if use_cache else None
+            shards.extend((reader.filename, digest, start, stop)
+                          for start, stop in reader.shards(num_shards))
+    if jobs > 1:
+        # build the binary idf store (if it is missing or stale) here, once, instead of in every
+        # worker at the same time
+        resources.idf_dict()
+        with ProcessPoolExecutor(jobs) as executor:
+            final_dict = _merge_partial_sums(executor.map(_partial_sums, shards))
+    else:
+        final_dict = _merge_partial_sums(map(_partial_sums, shards))
     processed_final_dict = {}
-    for term, val in final_dict.items():
-        if val[1] > 50 and '@' not in term and "http" not in term:
-            processed_final_dict[term] = [val[0] / val[1], val[1]]
-    items = sorted(processed_final_dict.items(), key=lambda x: (x[1][0], x[1][1]), reverse=True)
+    for term, (total, count) in final_dict.items():
+        if count > 50 and '@' not in term and "http" not in term:
+            processed_final_dict[term] = [total / count, count]
+    if top_n is None:
+        items = sorted(processed_final_dict.items(), key=lambda x: (x[1][0], x[1][1]),
+                       reverse=True)
+    else:
+        items = heapq.nlargest(top_n, processed_final_dict.items(),
+                               key=lambda x: (x[1][0], x[1][1]))
     with open(f"climate_keywords/{combined_filename}keywords.txt", "w") as f:
         writer = csv.writer(f)
         for term, val in items:
             writer.writerow([term, val])
 
 
-def _docs_from_climate_files(files: list) -> tuple:
-    """Returns a tuple of combined_filename and docs created from the given list of filenames
-    in climate_data."""
-    docs = []
-    combined_filename = ""
-    for filename in files:
-        docs += sh.list_doc_from_text(f'clicha_scrapy/{filename}.txt')
-        combined_filename += filename + "_"
-    return combined_filename, docs
+def _partial_sums(shard: tuple) -> dict:
+    """Returns a dict mapping each term in a shard of the articles of a file to a list of the
+    sum of its tf-idfs over the docs of the shard and the number of docs it occurs in.
+
+    This is the map step of find_possible_keywords, run in a worker process. The docs of the
+    shard are streamed, and their tf-idfs computed over a TermDocumentMatrix of
+    DOCS_PER_MATRIX docs at a time.
+
+    Instance Attributes:
+        - shard: a tuple of the name of the file, its hash (as returned by file_hash) if the
+        docs are to be read from and stored in a DocCache or None otherwise, the index of the
+        first article of the shard and the index after its last article
+    """
+    filename, digest, start, stop = shard
+    idf_dict = resources.idf_dict()
+    partial = {}
+    with CorpusReader(filename) as reader:
+        if digest is not None:
+            cache = DocCache()
+            docs = cache.cached_docs(
+                cache.key_of_hash(digest, sh.get_nlp(), (), start, stop, sh.MAX_CHUNK_CHARS),
+                sh.get_nlp().vocab,
+                lambda: sh.iter_docs(reader.articles(start, stop))
+            )
+        else:
+            docs = sh.iter_docs(reader.articles(start, stop))
+        while True:
+            matrix = TermDocumentMatrix.from_term_counts(
+                sh.term_counts(doc) for doc in islice(docs, DOCS_PER_MATRIX)
+            )
+            if matrix.num_docs == 0:
+                break
+            sums = matrix.term_sums(matrix.tf_idf(idf_dict.lookup(matrix.terms))).tolist()
+            counts = matrix.document_frequency().tolist()
+            for term, total, count in zip(matrix.terms, sums, counts):
+                if term in partial:
+                    partial[term][0] += total
+                    partial[term][1] += count
+                else:
+                    partial[term] = [total, count]
+    return partial
+
+
+def _merge_partial_sums(partials: Iterable[dict]) -> dict:
+    """Returns the partial aggregates returned by _partial_sums merged into one dict, in the
+    order the terms first occur.
+
+    This is the reduce step of find_possible_keywords.
+    """
+    final_dict = {}
+    for partial in partials:
+        for term, (total, count) in partial.items():
+            if term in final_dict:
+                final_dict[term][0] += total
+                final_dict[term][1] += count
+            else:
+                final_dict[term] = [total, count]
+    return final_dict
 
 
 def final_keywords(filename: str) -> None:
@@ -96,6 +269,7 @@ def final_keywords(filename: str) -> None:
 if __name__ == "__main__":
     # Sample Usage:
     # find_idf_tstar()
+    # update_idf_tstar()  # once more articles have been appended to tstar.txt
     # climate_files = ["un", "nasa"]
     # find_possible_keywords(climate_files)
     # final_keywords("un_nasa_keywords")
@@ -104,10 +278,14 @@ if __name__ == "__main__":
 
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['spaCy_helpers', 'collections', 'csv', 'python_ta.contracts'],
+        'extra-imports': [
+            'spaCy_helpers', 'resources', 'corpus_reader', 'doc_cache', 'idf_store',
+            'tfidf_engine', 'csv', 'heapq', 'os', 'concurrent.futures', 'itertools', 'typing',
+            'python_ta.contracts'
+        ],
         'allowed-io': [
-            'find_idf_tstar', 'create_idf_dict', 'find_possible_keywords',
-            '_docs_from_climate_files', 'final_keywords', 'python_ta.contracts'
+            'find_idf_tstar', 'find_possible_keywords',
+            'final_keywords', 'python_ta.contracts'
         ],
         'max-line-length': 100,
         'max-locals': 25,
@@ -0,0 +1,189 @@
+"""Climate Change Awareness (CliChA), Memory-mapped IDF Store
+
+This module provides the IdfStore, a compact binary file of inverse document frequencies that
+is memory-mapped instead of being parsed, so that opening it is near-instant and every process
+reading it shares the same pages.
+
+Copyright (c) 2020 Akshat Naik and Tony Hu.
+Licensed under the MIT License. See LICENSE in the project root for license information.
+"""
+import csv
+import hashlib
+import mmap
+import os
+import struct
+from typing import Iterable, Optional
+import numpy
+from atomic_file import write_atomically
+from tfidf_engine import DocumentFrequencyCounter
+
+
+MAGIC = b'CLICHA-IDF-1\0\0\0\0'
+# the magic bytes followed by the number of terms
+HEADER = struct.Struct(f'<{len(MAGIC)}sQ')
+
+
+class IdfStore:
+    """A read-only, dict-like view of the inverse document frequencies in a binary IDF file.
+
+    The file holds the 64-bit hashes of the terms in increasing order, followed by the idf of
+    each term in the same order, as float64. A term is looked up with a binary search over the
+    hashes, and the terms themselves are not stored at all.
+
+    Instance Attributes:
+        - path: the path of the binary IDF file
+
+    >>> write_idf_store('/tmp/clicha_idf_doctest.bin', {'ice': 0.5, 'sea': 2.0})
+    >>> store = IdfStore('/tmp/clicha_idf_doctest.bin')
+    >>> store['sea'], 'ice' in store, store.get('coal'), len(store)
+    (2.0, True, None, 2)
+    >>> store.lookup(['ice', 'coal']).tolist()
+    [0.5, nan]
+    """
+    path: str
+
+    # Private Instance Attributes:
+    #   - _mmap: the memory map of the file
+    #   - _hashes: the sorted term hashes, a view into _mmap
+    #   - _values: the idf of each hash, a view into _mmap
+    _mmap: Optional[mmap.mmap]
+    _hashes: numpy.ndarray
+    _values: numpy.ndarray
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, size = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a binary IDF file.")
+        self._hashes = numpy.frombuffer(self._mmap, dtype='<u8', count=size, offset=HEADER.size)
+        self._values = numpy.frombuffer(self._mmap, dtype='<f8', count=size,
+                                        offset=HEADER.size + 8 * size)
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __contains__(self, term: str) -> bool:
+        return self._position(term_hash(term)) is not None
+
+    def __getitem__(self, term: str) -> float:
+        position = self._position(term_hash(term))
+        if position is None:
+            raise KeyError(term)
+        return float(self._values[position])
+
+    def get(self, term: str, default: Optional[float] = None) -> Optional[float]:
+        """Returns the idf of term, or default if term has none."""
+        position = self._position(term_hash(term))
+        return default if position is None else float(self._values[position])
+
+    def lookup(self, terms: Iterable[str]) -> numpy.ndarray:
+        """Returns the idf of each term in terms, with NaN for the terms that have none."""
+        hashes = numpy.fromiter((term_hash(term) for term in terms), dtype='<u8')
+        values = numpy.full(len(hashes), numpy.nan)
+        if not len(self._hashes):
+            return values
+        positions = numpy.searchsorted(self._hashes, hashes)
+        positions[positions == len(self._hashes)] = 0
+        found = self._hashes[positions] == hashes
+        values[found] = self._values[positions[found]]
+        return values
+
+    def close(self) -> None:
+        """Releases the memory map. The store cannot be used afterwards."""
+        del self._hashes, self._values
+        self._mmap.close()
+        self._mmap = None
+
+    def _position(self, key: int) -> Optional[int]:
+        """Returns the position of the hash key in self._hashes, or None if it is not there."""
+        position = int(numpy.searchsorted(self._hashes, key))
+        if position < len(self._hashes) and int(self._hashes[position]) == key:
+            return position
+        return None
+
+
+def term_hash(term: str) -> int:
+    """Returns the 64-bit hash of term stored in binary IDF files.
+
+    Unlike the built-in hash, it is the same in every process and every run.
+    """
+    return int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def write_idf_store(path: str, idf_dict: dict) -> None:
+    """Writes the inverse document frequencies in idf_dict to path as a binary IDF file.
+
+    The file is written atomically, so a process can never open it half-written, and any
+    number of processes may write it at once (see atomic_file.write_atomically).
+    """
+    hashes = numpy.fromiter((term_hash(term) for term in idf_dict), dtype='<u8',
+                            count=len(idf_dict))
+    values = numpy.fromiter(idf_dict.values(), dtype='<f8', count=len(idf_dict))
+    order = numpy.argsort(hashes, kind='stable')
+    hashes, values = hashes[order], values[order]
+    if len(hashes) > 1 and (hashes[1:] == hashes[:-1]).any():
+        raise ValueError("Two terms have the same hash; they cannot be told apart in an IdfStore.")
+
+    def write(f: object) -> None:
+        f.write(HEADER.pack(MAGIC, len(hashes)))
+        f.write(hashes.tobytes())
+        f.write(values.tobytes())
+
+    write_atomically(path, 'wb', write)
+
+
+def write_idf_csv(csv_path: str, idf_dict: dict) -> None:
+    """Writes the inverse document frequencies in idf_dict to csv_path as term,idf rows,
+    atomically like write_idf_store."""
+
+    def write(f: object) -> None:
+        writer = csv.writer(f)
+        for key, val in idf_dict.items():
+            writer.writerow([key, val])
+
+    write_atomically(csv_path, 'w', write)
+
+
+def load_idf_store(csv_path: str, path: str, counts_path: Optional[str] = None) -> IdfStore:
+    """Returns the IdfStore at path, first (re)building it from the term,idf rows of the CSV
+    file at csv_path if it is missing or older than the CSV file.
+
+    If counts_path is given and holds document frequencies saved by a DocumentFrequencyCounter
+    more recently than the CSV file was written, the CSV file is first rewritten with the
+    idfs of those counts, so that updating the counts is all it takes to update the idfs.
+
+    Processes that find the store missing at the same time each rebuild it, safely but in vain,
+    so a pool of processes should have it loaded once before the pool starts.
+    """
+    if counts_path is not None and os.path.exists(counts_path) and (
+            not os.path.exists(csv_path)
+            or os.path.getmtime(csv_path) < os.path.getmtime(counts_path)):
+        write_idf_csv(csv_path, DocumentFrequencyCounter.load(counts_path).idf_dict())
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(csv_path):
+        with open(csv_path, 'r', encoding='utf-8', errors='ignore') as f:
+            write_idf_store(path, {term: float(idf) for term, idf in csv.reader(f)})
+    return IdfStore(path)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': [
+            'csv', 'hashlib', 'mmap', 'os', 'struct', 'typing', 'numpy', 'atomic_file',
+            'tfidf_engine', 'python_ta.contracts'
+        ],
+        'allowed-io': ['IdfStore.__init__', 'load_idf_store'],
+        'max-line-length': 100,
+        'max-locals': 25,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
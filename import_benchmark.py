@@ -0,0 +1,140 @@
+"""Climate Change Awareness (CliChA), Import-time Benchmark
+
+This module measures how long it takes to import a module (by default main, i.e. to start the
+GUI) with python -X importtime, and checks it against a budget, so that a heavy import creeping
+back into the startup path (for ex: loading a spaCy pipeline at import) gets noticed.
+
+Copyright (c) 2020 Akshat Naik and Tony Hu.
+Licensed under the MIT License. See LICENSE in the project root for license information.
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Optional
+
+
+# the default budget, in seconds, for importing main
+DEFAULT_BUDGET = 3.0
+
+
+def import_times(module: str) -> dict:
+    """Returns a report of importing module in a fresh interpreter.
+
+    The report is a dict with the following keys:
+        - 'total_seconds': the time spent importing module and everything it imports
+        - 'imports': a list of (cumulative seconds, name) pairs, one for each module imported
+        directly by module or by the interpreter itself, slowest first
+        - 'pipelines_loaded': the number of spaCy pipelines loaded by the import
+
+    Instance Attributes:
+        - module: the name of the module to import, for ex: 'main'
+    """
+    code = f"import {module}, spaCy_helpers; print(spaCy_helpers.pipelines_loaded())"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True)
+    imports = parse_import_times(result.stderr)
+    return {
+        'total_seconds': sum(seconds for seconds, _ in imports),
+        'imports': imports,
+        'pipelines_loaded': int(result.stdout.split()[-1])
+    }
+
+
+def parse_import_times(stderr: str) -> list:
+    """Returns the (cumulative seconds, name) pair of each module imported directly by the
+    module imported, or by the interpreter itself, in the output of python -X importtime,
+    slowest first.
+
+    >>> parse_import_times('''import time: self [us] | cumulative [us] | imported package
+    ... import time:       120 |        120 |     tkinter.constants
+    ... import time:      5000 |       5120 |   tkinter
+    ... import time:       900 |      30900 |   spaCy_helpers
+    ... import time:       300 |      36320 | main''')
+    [(0.03632, 'main')]
+    """
+    imports = []
+    for line in stderr.splitlines():
+        # each line reads 'import time: self [us] | cumulative [us] | name', where the name
+        # is indented by how deep in the import tree the module was imported
+        if not line.startswith('import time:') or line.endswith('imported package'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name[1:].startswith(' '):
+            imports.append((int(cumulative) / 1e6, name.strip()))
+    imports.sort(reverse=True)
+    return imports
+
+
+def format_report(module: str, report: dict, budget: float, top: int = 10) -> tuple:
+    """Returns a tuple of the text of a report returned by import_times for module, with its
+    top slowest imports, and the list of the ways in which importing module failed: taking
+    longer than budget or loading a spaCy pipeline.
+
+    >>> report = {'total_seconds': 1.5, 'imports': [(1.2, 'spaCy_helpers'), (0.3, 'tkinter')],
+    ...           'pipelines_loaded': 1}
+    >>> text, failures = format_report('main', report, 1.0, top=1)
+    >>> print(text)
+    Importing main: 1.50s (budget: 1.00s)
+       1.200s  spaCy_helpers
+    FAILED: importing main exceeded its budget
+    FAILED: importing main loaded 1 spaCy pipeline(s)
+    >>> format_report('main', {**report, 'pipelines_loaded': 0}, 2.0)[1]
+    []
+    """
+    lines = [f"Importing {module}: {report['total_seconds']:.2f}s (budget: {budget:.2f}s)"]
+    for seconds, name in report['imports'][:top]:
+        lines.append(f"{seconds:8.3f}s  {name}")
+    failures = []
+    if report['total_seconds'] > budget:
+        failures.append(f"importing {module} exceeded its budget")
+    if report['pipelines_loaded']:
+        failures.append(f"importing {module} loaded {report['pipelines_loaded']} "
+                        f"spaCy pipeline(s)")
+    lines.extend(f"FAILED: {failure}" for failure in failures)
+    return '\n'.join(lines), failures
+
+
+def main(argv: Optional[list] = None) -> None:
+    """Prints the import-time report of a module, and exits with status 1 if importing it
+    took longer than the budget or loaded a spaCy pipeline, for ex:
+
+    python import_benchmark.py --budget 2.5
+    """
+    parser = argparse.ArgumentParser(description="Checks the import time of a module.")
+    parser.add_argument('--module', default='main', help="the module to import")
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                        help="the maximum number of seconds importing the module may take")
+    parser.add_argument('--top', type=int, default=10,
+                        help="the number of slowest imports to print")
+    args = parser.parse_args(argv)
+    text, failures = format_report(args.module, import_times(args.module), args.budget,
+                                   args.top)
+    print(text)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__' and len(sys.argv) > 1:
+    main()
+elif __name__ == '__main__':
+    # Sample Usage:
+    # python import_benchmark.py --budget 2.5
+    # (run without arguments, the doctests and python_ta checks of this module are run instead;
+    # main() can be called directly to check the import of main against DEFAULT_BUDGET)
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['argparse', 'os', 'subprocess', 'sys', 'typing', 'python_ta.contracts'],
+        'allowed-io': ['main'],
+        'max-line-length': 100,
+        'max-locals': 25,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
@@ -0,0 +1,136 @@
+"""Climate Change Awareness (CliChA), Keyword Automaton
+
+This module provides the KeywordAutomaton, an Aho-Corasick automaton that finds keywords in
+raw text, as an alternative to spaCy's PhraseMatcher that needs no tokenization.
+
+Copyright (c) 2020 Akshat Naik and Tony Hu.
+Licensed under the MIT License. See LICENSE in the project root for license information.
+"""
+import re
+from collections import deque
+
+
+# approximates the tokens of spaCy's English tokenizer: words, single punctuation characters,
+# and whitespace other than a single space
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]|\s{2,}|[^\S ]")
+
+
+class KeywordAutomaton:
+    """An Aho-Corasick automaton over lowercased keywords.
+
+    A keyword is found wherever it occurs in the lowercased text and is not part of a longer
+    word, i.e. the characters right before and after it are not word characters. This mirrors a
+    PhraseMatcher matching on the 'LOWER' attribute: like it, every occurrence is found, even
+    when occurrences overlap, and the words of a multi-word keyword must be separated by a
+    single space.
+
+    Instance Attributes:
+        - terms: the (lowercased) keywords, each identified by its index
+
+    >>> automaton = KeywordAutomaton(['ice', 'sea ice', 'sea'])
+    >>> [automaton.terms[i] for _, _, i in automaton.find('Sea ice, nice icebergs and ice.')]
+    ['sea', 'sea ice', 'ice', 'ice']
+    """
+    terms: list
+
+    # Private Instance Attributes:
+    #   - _goto: the transitions of each state, mapping a character to the next state
+    #   - _fail: the state each state falls back to when no transition matches
+    #   - _output: the indices of the terms that end at each state
+    _goto: list
+    _fail: list
+    _output: list
+
+    def __init__(self, terms: list) -> None:
+        self.terms = []
+        self._goto, self._fail, self._output = [{}], [0], [[]]
+        for term in terms:
+            term = ' '.join(term.lower().split())
+            if not term or term in self.terms:
+                continue
+            state = 0
+            for char in term:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state].append(len(self.terms))
+            self.terms.append(term)
+        self._build_fail_links()
+
+    def _build_fail_links(self) -> None:
+        """Computes the fail link of each state, breadth first from the root."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                if self._fail[child] == child:
+                    self._fail[child] = 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find(self, text: str) -> list:
+        """Returns a list of (start, end, term index) tuples, one for each occurrence of a term
+        in text, where text[start:end] is the occurrence."""
+        lowered = _lower(text)
+        goto, fail, output, terms = self._goto, self._fail, self._output, self.terms
+        matches = []
+        state = 0
+        for pos, char in enumerate(lowered):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for term_id in output[state]:
+                start, end = pos + 1 - len(terms[term_id]), pos + 1
+                if not (_is_word_char(lowered, start - 1) or _is_word_char(lowered, end)):
+                    matches.append((start, end, term_id))
+        return matches
+
+
+def approximate_token_count(text: str) -> int:
+    """Returns an approximation of the number of tokens spaCy splits text into,
+    without tokenizing it.
+
+    >>> approximate_token_count('Sea ice, nice icebergs and ice.')
+    8
+    """
+    return sum(1 for _ in TOKEN_PATTERN.finditer(text))
+
+
+def _lower(text: str) -> str:
+    """Returns text lowercased, character by character, so that offsets into the result are
+    offsets into text."""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    # a few characters (for ex: 'İ') lowercase into more than one character
+    return ''.join(char.lower() if len(char.lower()) == 1 else char for char in text)
+
+
+def _is_word_char(text: str, pos: int) -> bool:
+    """Returns whether there is a word character at pos in text."""
+    return 0 <= pos < len(text) and (text[pos].isalnum() or text[pos] == '_')
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['re', 'collections', 'python_ta.contracts'],
+        'max-line-length': 100,
+        'max-locals': 25,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
@@ -0,0 +1,110 @@
+"""Climate Change Awareness (CliChA), Keyword Weights
+
+This module provides the KeywordWeights, the weight of each matched word in the Climate
+Awareness Index (CAI) of an article, compiled once into a vector indexed by integer keyword id,
+so that the CAIs of a batch of articles are computed as a single sparse matrix-vector product
+instead of an idf lookup for every match.
+
+Copyright (c) 2020 Akshat Naik and Tony Hu.
+Licensed under the MIT License. See LICENSE in the project root for license information.
+"""
+from typing import Iterable, Union
+import numpy
+from idf_store import IdfStore
+
+
+# the weight of a matched word with no idf
+UNKNOWN_WEIGHT = 10
+
+
+class KeywordWeights:
+    """The weight in the CAI of each word that can be matched in an article: its idf, or
+    UNKNOWN_WEIGHT if it has none.
+
+    The words are given integer keyword ids in order, and the weight of each is looked up once,
+    when the weights are compiled. Any other word matched in an article is given the fallback
+    id, whose weight is UNKNOWN_WEIGHT, so the words, their ids and the weights never change once
+    compiled, and a KeywordWeights can be shared by any number of callers and threads.
+
+    Instance Attributes:
+        - words: the words, indexed by their keyword id
+        - weights: the weight of each word, indexed by its keyword id, followed by the weight of
+          the fallback id
+
+    Representation Invariants:
+        - len(self.weights) == len(self.words) + 1
+        - self.weights[-1] == UNKNOWN_WEIGHT
+
+    >>> keyword_weights = KeywordWeights({'ice': 0.5, 'sea': 2.0}, ['ice', 'sea'])
+    >>> keyword_weights.score([('ice', 4), ('melt', 1)], 100)
+    0.12
+    >>> keyword_weights.words, keyword_weights.weights.tolist()
+    (['ice', 'sea'], [0.5, 2.0, 10.0])
+    >>> keyword_weights.ids(['sea', 'melt', 'ice']).tolist()
+    [1, 2, 0]
+    >>> keyword_weights.score_batch([[('ice', 4), ('melt', 1)], [('sea', 1)], []], [100, 0, 5])
+    [0.12, 2.0, 0.0]
+    """
+    words: list
+    weights: numpy.ndarray
+
+    # Private Instance Attributes:
+    #   - _ids: a dict mapping each word to its keyword id
+    _ids: dict
+
+    def __init__(self, idf_dict: Union[dict, IdfStore], words: Iterable[str] = ()) -> None:
+        self.words = list(dict.fromkeys(words))
+        self._ids = {word: i for i, word in enumerate(self.words)}
+        weights = [idf_dict.get(word, UNKNOWN_WEIGHT) for word in self.words]
+        self.weights = numpy.array(weights + [UNKNOWN_WEIGHT], dtype=float)
+
+    def ids(self, words: Iterable[str]) -> numpy.ndarray:
+        """Returns the keyword id of each word in words, or the fallback id (len(self.words))
+        for the words that were not compiled."""
+        fallback = len(self.words)
+        return numpy.array([self._ids.get(word, fallback) for word in words], dtype=numpy.int64)
+
+    def score(self, matches: list, length_of_doc: int) -> float:
+        """Returns the CAI of an article (see score_batch)."""
+        return self.score_batch([matches], [length_of_doc])[0]
+
+    def score_batch(self, matches: list, lengths_of_docs: list) -> list:
+        """Returns the CAI of each article, as returned by
+        find_climate_articles.article_climate_awareness_index, where matches are the
+        (word, count) pairs of each article and lengths_of_docs the length of each article
+        (as a Doc).
+
+        The counts of the articles form a sparse matrix, in Compressed Sparse Row form, with a
+        row for each article and a column for each keyword id, which is multiplied by
+        self.weights. The products of each row are summed in order, so the CAIs are exactly
+        those of summing them one match at a time.
+
+        Preconditions:
+            - len(matches) == len(lengths_of_docs)
+            - all(length >= 0 for length in lengths_of_docs)
+        """
+        ids = self.ids(word for pairs in matches for word, _ in pairs)
+        counts = numpy.array([count for pairs in matches for _, count in pairs], dtype=numpy.int64)
+        rows = numpy.repeat(numpy.arange(len(matches)), [len(pairs) for pairs in matches])
+        totals = numpy.bincount(rows, weights=self.weights[ids] * counts, minlength=len(matches))
+        lengths = numpy.maximum(numpy.array(lengths_of_docs, dtype=numpy.int64), 1)
+        # the built-in round, which rounds exactly, unlike numpy.round
+        return [round(cai, 5) for cai in (totals / lengths).tolist()]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['typing', 'numpy', 'idf_store', 'python_ta.contracts'],
+        'max-line-length': 100,
+        'max-locals': 25,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
@@ -6,13 +6,17 @@ to be presented in the GUI program.
 Copyright (c) 2020 Akshat Naik and Tony Hu.
 Licensed under the MIT License. See LICENSE in the project root for license information.
 """
-from clicha_scrapy import demo_nytimes
-from find_climate_articles import article_climate_awareness_index, create_idf_dict
 import spaCy_helpers as sh
+import resources
 
 
 def run_demo_nytimes() -> None:
-    """Call the demo version of the NyTimesTextSpider."""
+    """Call the demo version of the NyTimesTextSpider.
+
+    Scrapy and Twisted are only imported here, so that they are not imported along with this
+    module when the GUI starts.
+    """
+    from clicha_scrapy import demo_nytimes
     demo_nytimes.run_spider()
 
 
@@ -20,19 +24,17 @@ def demo_processing_cai() -> list:
     """Return a list of floats, each corresponding to a Climate Awareness Index of an article.
 
     This is a demo processing adapted from find_climate_articles.py but in much smaller scale.
+    The keywords, keyword weights and matcher are only loaded the first time it is called.
     WARNING: Run ONLY after run_demo_nytimes()
     """
-    with open('climate_keywords/keywords.txt') as h:
-        keywords = h.read().split('\n')
-    idf_dict = create_idf_dict()
-    matcher = sh.phrase_matcher(keywords)
-    docs = sh.list_doc_from_text('demo_nytimes.txt')
-    list_articles_cai = []
+    matcher = resources.matcher()
+    docs = sh.iter_doc_from_text('demo_nytimes.txt')
+    matches, lengths = [], []
     for doc in docs:
         _, _, counter_items = sh.phrase_matching(doc, matcher)
-        article_cai = article_climate_awareness_index(counter_items, idf_dict, len(doc))
-        list_articles_cai.append(article_cai)
-    return list_articles_cai
+        matches.append(counter_items)
+        lengths.append(len(doc))
+    return resources.keyword_weights().score_batch(matches, lengths)
 
 
 if __name__ == '__main__':
@@ -41,11 +43,10 @@ if __name__ == '__main__':
 
     import python_ta
     python_ta.check_all(config={
-        'allowed-io': ['demo_processing_cai'],
         'extra-imports': [
             'clicha_scrapy',
-            'find_climate_articles',
             'spaCy_helpers',
+            'resources',
             'python_ta.contracts'
         ],
         'max-line-length': 100,
@@ -53,7 +54,8 @@ if __name__ == '__main__':
         'max-locals': 25,
         # W0221: by the documentation, parse does not need **kwargs
         # W0613: 'closed' is called by Scrapy, requiring the 'reason' argument
-        'disable': ['R1705', 'W0221', 'W0613'],
+        # C0415: demo_nytimes is imported in run_demo_nytimes to keep the GUI startup fast
+        'disable': ['R1705', 'W0221', 'W0613', 'C0415'],
     })
 
     import python_ta.contracts
@@ -0,0 +1,194 @@
+"""Climate Change Awareness (CliChA), Shared Resources
+
+This module provides a process-wide cache of the resources loaded from files over and over
+again: the keyword list, the idf dict of the Toronto Star articles and the matchers, prefilters
+and weights compiled from the keyword list. Each is loaded once per process, and again only if
+its file changes.
+
+Copyright (c) 2020 Akshat Naik and Tony Hu.
+Licensed under the MIT License. See LICENSE in the project root for license information.
+"""
+import os
+import re
+import threading
+from typing import Callable, Optional, Union
+import spacy
+import spaCy_helpers as sh
+from doc_cache import file_hash
+from idf_store import IdfStore, load_idf_store
+from keyword_automaton import KeywordAutomaton
+from keyword_weights import KeywordWeights
+
+
+KEYWORDS_FILE = 'climate_keywords/keywords.txt'
+IDF_FILE = 'climate_keywords/tstar_idf.txt'
+IDF_STORE_FILE = 'climate_keywords/tstar_idf.bin'
+# the document frequencies the idfs in IDF_FILE are computed from
+DF_FILE = 'climate_keywords/tstar_df.json'
+
+
+class ResourceCache:
+    """A cache of values loaded from files, each reloaded only once one of its files changes.
+
+    A file counts as changed when its contents do, or when it is created or removed. Its
+    modification time and size are checked on every lookup, and only if either of them differs
+    is the file hashed again, so a file that was touched without being changed does not cause a
+    reload.
+    """
+    # Private Instance Attributes:
+    #   - _entries: a dict mapping each key to a tuple of the signatures of its files and its
+    #   value, where the signature of a file is a list of its mtime, size and hash, or None if
+    #   the file does not exist
+    #   - _lock: the lock held while looking up or loading a value, since the GUI loads
+    #   resources from a background thread. It is reentrant, since loading a value may look
+    #   up another one (for ex: a matcher looks up the keywords)
+    _entries: dict
+    _lock: threading.RLock
+
+    def __init__(self) -> None:
+        self._entries = {}
+        self._lock = threading.RLock()
+
+    def get(self, key: tuple, files: list, load: Callable[[], object]) -> object:
+        """Returns the value stored under key, or the value returned by load() if there is
+        none or if any of files has changed since it was loaded.
+
+        Instance Attributes:
+            - key: the key of the value, for ex: ('matcher', 'LOWER', 'spacy')
+            - files: the names of the files the value is loaded from
+            - load: a function returning the value
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and _unchanged(entry[0]):
+                return entry[1]
+            # the files are signed before loading, so a change made while loading is not missed
+            signatures = {filename: _signature(filename) for filename in files}
+            value = load()
+            self._entries[key] = (signatures, value)
+            return value
+
+    def invalidate(self, key: Optional[tuple] = None) -> None:
+        """Removes the value stored under key, or every value if key is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+_cache = ResourceCache()
+
+
+def keywords() -> list:
+    """Returns the keywords in climate_keywords/keywords.txt.
+
+    CAUTION: The list is shared by every caller, so it must not be modified.
+    """
+    return _cache.get(('keywords',), [KEYWORDS_FILE], _read_keywords)
+
+
+def idf_dict() -> IdfStore:
+    """Returns the idf_dict of climate_keywords/tstar_idf.txt, as an IdfStore (see
+    find_climate_keywords.create_idf_dict).
+
+    If the document frequencies in climate_keywords/tstar_df.json have been updated since, the
+    idfs are recomputed from them first.
+    """
+    return _cache.get(('idf_dict',), [IDF_FILE, DF_FILE],
+                      lambda: load_idf_store(IDF_FILE, IDF_STORE_FILE, DF_FILE))
+
+
+def keyword_weights() -> KeywordWeights:
+    """Returns the KeywordWeights of the keywords in climate_keywords/keywords.txt, compiled from
+    the words their matches are reported as (see spaCy_helpers.keyword_lemmas) and weighted by
+    the idf_dict.
+
+    The KeywordWeights is compiled once and never changes, so it is safely shared by every
+    caller.
+    """
+    return _cache.get(('keyword_weights',), [KEYWORDS_FILE, IDF_FILE, DF_FILE],
+                      lambda: KeywordWeights(idf_dict(), sh.keyword_lemmas(keywords())))
+
+
+def matcher(attribute: str = "LOWER",
+            backend: str = "spacy") -> Union[spacy.matcher.PhraseMatcher, KeywordAutomaton]:
+    """Returns the matcher returned by spaCy_helpers.phrase_matcher for the keywords in
+    climate_keywords/keywords.txt, with the given attribute and backend."""
+    return _cache.get(('matcher', attribute, backend), [KEYWORDS_FILE],
+                      lambda: sh.phrase_matcher(keywords(), attribute, backend))
+
+
+def prefilter(attribute: str = "LOWER") -> Optional[re.Pattern]:
+    """Returns the pattern returned by spaCy_helpers.keyword_prefilter for the keywords in
+    climate_keywords/keywords.txt, with the given attribute."""
+    return _cache.get(('prefilter', attribute), [KEYWORDS_FILE],
+                      lambda: sh.keyword_prefilter(keywords(), attribute))
+
+
+def invalidate() -> None:
+    """Forgets every resource, so that each is loaded again the next time it is requested."""
+    _cache.invalidate()
+
+
+def _read_keywords() -> list:
+    """Returns the keywords in climate_keywords/keywords.txt, one for each line."""
+    with open(KEYWORDS_FILE) as h:
+        return h.read().split('\n')
+
+
+def _signature(filename: str) -> Optional[list]:
+    """Returns the signature of filename: its modification time, size and hash, or None if it
+    does not exist (for ex: the idf_dict may be loaded from either of IDF_FILE and DF_FILE while
+    the other one has not been written yet)."""
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size, file_hash(filename)]
+
+
+def _unchanged(signatures: dict) -> bool:
+    """Returns whether none of the files in signatures has changed since it was signed.
+
+    The signature of a file that was touched but not changed is updated in place, so it is
+    not hashed again on the next lookup.
+    """
+    for filename, signature in signatures.items():
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            if signature is None:
+                continue
+            return False
+        if signature is None:
+            return False
+        if [stat.st_mtime_ns, stat.st_size] == signature[:2]:
+            continue
+        if stat.st_size != signature[1] or file_hash(filename) != signature[2]:
+            return False
+        signature[0] = stat.st_mtime_ns
+    return True
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': [
+            'os', 're', 'threading', 'typing', 'spacy', 'spaCy_helpers', 'doc_cache',
+            'idf_store', 'keyword_automaton', 'keyword_weights', 'python_ta.contracts'
+        ],
+        'allowed-io': ['_read_keywords'],
+        'max-line-length': 100,
+        'max-locals': 25,
+        # E9997: The h when using 'with open(...) as h' is a lowercase letter by convention.
+        'disable': ['R1705', 'C0200', 'E9997']
+    })
+
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
@@ -0,0 +1,176 @@
+"""Climate Change Awareness (CliChA), Results Database
+
+This module provides the ResultsDatabase, an indexed SQLite database of the article-level
+results of find_climate_articles.articles_process_yearly, along with a small query API over it,
+so that questions about the matches do not need every processed data file to be scanned.
+
+Copyright (c) 2020 Akshat Naik and Tony Hu.
+Licensed under the MIT License. See LICENSE in the project root for license information.
+"""
+import sqlite3
+from typing import Optional
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS years (
+    dataset TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    num_articles INTEGER,
+    PRIMARY KEY (dataset, year)
+);
+CREATE TABLE IF NOT EXISTS articles (
+    dataset TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    article INTEGER NOT NULL,
+    distinct_matches INTEGER NOT NULL,
+    total_matches INTEGER NOT NULL,
+    cai REAL NOT NULL,
+    PRIMARY KEY (dataset, year, article)
+);
+CREATE TABLE IF NOT EXISTS matches (
+    dataset TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    article INTEGER NOT NULL,
+    keyword TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (dataset, year, article, keyword)
+);
+-- the primary keys above already index (dataset, year)
+CREATE INDEX IF NOT EXISTS articles_by_cai ON articles (dataset, cai);
+CREATE INDEX IF NOT EXISTS matches_by_keyword ON matches (keyword, count);
+"""
+
+
+class ResultsDatabase:
+    """An SQLite database of the keywords matched in each article of each year of a dataset.
+
+    Instance Attributes:
+        - path: the path of the database file
+
+    >>> db = ResultsDatabase(':memory:')
+    >>> db.upsert_year('nytimes', 1990, [[7, 2, 5, 0.01, [('glacier', 4), ('ice', 1)]]], 100)
+    >>> db.articles('nytimes', 1990, 1999, keyword='glacier', min_count=4)
+    [(1990, 7, 2, 5, 0.01)]
+    >>> db.keyword_counts('nytimes', 1990, 7)
+    [('glacier', 4), ('ice', 1)]
+    """
+    path: str
+
+    # Private Instance Attributes:
+    #   - _connection: the connection to the database
+    _connection: sqlite3.Connection
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        # wait for another process writing to the database instead of failing right away
+        self._connection = sqlite3.connect(path, timeout=60)
+        self._connection.executescript(SCHEMA)
+
+    def upsert_year(self, dataset: str, year: int, rows: list,
+                    num_articles: Optional[int] = None) -> None:
+        """Replaces the results of year in dataset with rows, in a single transaction.
+
+        Instance Attributes:
+            - dataset: the name of the dataset (for ex: 'nytimes')
+            - year: the year of the results
+            - rows: a list of [article index, distinct matches, total matches, CAI,
+            (keyword, count) pairs], i.e. the rows of a processed data file
+            - num_articles: the number of articles processed in year, if known
+        """
+        with self._connection:
+            for table in ('articles', 'matches'):
+                self._connection.execute(f"DELETE FROM {table} WHERE dataset = ? AND year = ?",
+                                         (dataset, year))
+            self._connection.execute("INSERT OR REPLACE INTO years VALUES (?, ?, ?)",
+                                     (dataset, year, num_articles))
+            self._connection.executemany(
+                "INSERT INTO articles VALUES (?, ?, ?, ?, ?, ?)",
+                ((dataset, year, article, distinct, total, cai)
+                 for article, distinct, total, cai, _ in rows)
+            )
+            self._connection.executemany(
+                "INSERT INTO matches VALUES (?, ?, ?, ?, ?)",
+                ((dataset, year, row[0], keyword, count)
+                 for row in rows for keyword, count in row[4])
+            )
+
+    def articles(self, dataset: str, year_start: int, year_end: int,
+                 keyword: Optional[str] = None, min_count: int = 1,
+                 min_cai: Optional[float] = None) -> list:
+        """Returns a list of (year, article index, distinct matches, total matches, CAI) of the
+        articles of dataset from year_start to year_end (both inclusive), in order of year and
+        index, optionally restricted to those with a CAI of at least min_cai, or with at least
+        min_count matches of keyword.
+        """
+        query = ("SELECT a.year, a.article, a.distinct_matches, a.total_matches, a.cai "
+                 "FROM articles a ")
+        conditions = ["a.dataset = ?", "a.year BETWEEN ? AND ?"]
+        parameters = [dataset, year_start, year_end]
+        if keyword is not None:
+            query += ("JOIN matches m ON m.dataset = a.dataset AND m.year = a.year "
+                      "AND m.article = a.article ")
+            conditions += ["m.keyword = ?", "m.count >= ?"]
+            parameters += [keyword, min_count]
+        if min_cai is not None:
+            conditions.append("a.cai >= ?")
+            parameters.append(min_cai)
+        query += "WHERE " + " AND ".join(conditions) + " ORDER BY a.year, a.article"
+        return self._connection.execute(query, parameters).fetchall()
+
+    def keyword_counts(self, dataset: str, year: int, article: int) -> list:
+        """Returns the (keyword, count) pairs of an article, most frequent first."""
+        return self._connection.execute(
+            "SELECT keyword, count FROM matches WHERE dataset = ? AND year = ? AND article = ? "
+            "ORDER BY count DESC, keyword", (dataset, year, article)
+        ).fetchall()
+
+    def yearly_summary(self, dataset: str, year_start: int, year_end: int,
+                       min_distinct: int = 8, min_total: int = 15, min_cai: float = 0.02,
+                       cai_min_distinct: int = 5) -> list:
+        """Returns a list of [year, number of climate aware articles, CAI of the year, number of
+        articles processed] for each stored year of dataset from year_start to year_end (both
+        inclusive), as computed by find_climate_articles.articles_process.
+
+        An article is climate aware if it has at least min_distinct distinct matches, at least
+        min_total matches and a CAI of at least min_cai (see
+        find_climate_articles.test_climate_aware). The CAI of a year is the sum of the CAIs of
+        its articles with at least cai_min_distinct distinct matches.
+        """
+        return [list(row) for row in self._connection.execute(
+            "SELECT y.year, "
+            "COALESCE(SUM(a.distinct_matches >= ? AND a.total_matches >= ? AND a.cai >= ?), 0), "
+            "COALESCE(SUM(CASE WHEN a.distinct_matches >= ? THEN a.cai ELSE 0 END), 0), "
+            "y.num_articles "
+            "FROM years y LEFT JOIN articles a ON a.dataset = y.dataset AND a.year = y.year "
+            "WHERE y.dataset = ? AND y.year BETWEEN ? AND ? "
+            "GROUP BY y.year ORDER BY y.year",
+            (min_distinct, min_total, min_cai, cai_min_distinct, dataset, year_start, year_end)
+        )]
+
+    def close(self) -> None:
+        """Closes the connection to the database."""
+        self._connection.close()
+
+    def __enter__(self) -> 'ResultsDatabase':
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['sqlite3', 'typing', 'python_ta.contracts'],
+        'max-line-length': 100,
+        'max-locals': 25,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
@@ -0,0 +1,194 @@
+"""Climate Change Awareness (CliChA), Columnar Results Store
+
+This module provides the ResultsStore, which keeps the per-article results of
+find_climate_articles.articles_process_yearly as typed columns, one .npy file per column, so
+that they can be memory-mapped and read a column at a time instead of being parsed back out of
+CSV rows.
+
+Copyright (c) 2020 Akshat Naik and Tony Hu.
+Licensed under the MIT License. See LICENSE in the project root for license information.
+"""
+import ast
+import csv
+import json
+import os
+import shutil
+import tempfile
+from typing import Iterable, Optional
+import numpy
+
+
+# the dtype of each column of a year
+COLUMNS = {
+    'article': numpy.int64,  # the index of the article in its year
+    'distinct': numpy.int32,  # the number of distinct keywords matched in the article
+    'total': numpy.int32,  # the total number of keywords matched in the article
+    'cai': numpy.float64,  # the Climate Awareness Index of the article
+    # the keyword counts of article i are keyword_id[keyword_ptr[i]:keyword_ptr[i + 1]] and
+    # keyword_count[keyword_ptr[i]:keyword_ptr[i + 1]]
+    'keyword_ptr': numpy.int64,
+    'keyword_id': numpy.int32,
+    'keyword_count': numpy.int32
+}
+
+
+class ResultsStore:
+    """The per-article results of a dataset, stored by year as columns.
+
+    Each year is a directory holding one .npy file for each column in COLUMNS, with one row for
+    each article with at least one match, in the order of the processed data file of the year.
+    Keywords are stored as integer ids into the keywords of the year, which are kept in
+    meta.json along with the number of articles processed in the year.
+
+    Instance Attributes:
+        - directory: the directory the years are stored in
+
+    >>> store = ResultsStore('/tmp/clicha_results_doctest')
+    >>> store.write_year(1990, [[3, 2, 5, 0.01, [('ice', 4), ('sea', 1)]]], num_articles=10)
+    >>> store.load_year(1990, ['article', 'cai'])['cai'].tolist()
+    [0.01]
+    >>> store.keyword_counts(1990)
+    [[('ice', 4), ('sea', 1)]]
+    """
+    directory: str
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def write_year(self, year: int, rows: list, num_articles: Optional[int] = None) -> None:
+        """Stores the results of year, replacing any stored before.
+
+        The year is written to a temporary directory first and then moved into place, so a
+        crash never leaves it half-written.
+
+        Instance Attributes:
+            - year: the year of the results
+            - rows: a list of [article index, distinct matches, total matches, CAI,
+            (keyword, count) pairs], i.e. the rows of a processed data file
+            - num_articles: the number of articles processed in year, if known
+        """
+        keywords, keyword_ids = [], {}
+        ids, counts, ptr = [], [], [0]
+        for *_, counter_items in rows:
+            for keyword, count in counter_items:
+                if keyword not in keyword_ids:
+                    keyword_ids[keyword] = len(keywords)
+                    keywords.append(keyword)
+                ids.append(keyword_ids[keyword])
+                counts.append(count)
+            ptr.append(len(ids))
+        columns = {
+            'article': [row[0] for row in rows], 'distinct': [row[1] for row in rows],
+            'total': [row[2] for row in rows], 'cai': [row[3] for row in rows],
+            'keyword_ptr': ptr, 'keyword_id': ids, 'keyword_count': counts
+        }
+        path = self._path(year)
+        # a directory with a unique name, like the temporary files of atomic_file, so that
+        # processes writing the same year at once never write to the same directory
+        temp_path = tempfile.mkdtemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.',
+                                     suffix='.tmp')
+        for name, values in columns.items():
+            numpy.save(os.path.join(temp_path, name + '.npy'),
+                       numpy.array(values, dtype=COLUMNS[name]))
+        with open(os.path.join(temp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'num_articles': num_articles, 'keywords': keywords}, f)
+        # a directory cannot be replaced by another, so the old one is moved out of the way
+        if os.path.exists(path):
+            os.rename(path, temp_path + '.old')
+        os.rename(temp_path, path)
+        shutil.rmtree(temp_path + '.old', ignore_errors=True)
+
+    def years(self) -> list:
+        """Returns the stored years, in increasing order."""
+        return sorted(int(name) for name in os.listdir(self.directory) if name.isdigit())
+
+    def has_year(self, year: int) -> bool:
+        """Returns whether the results of year are stored."""
+        return os.path.isdir(self._path(year))
+
+    def load_year(self, year: int, columns: Optional[Iterable[str]] = None) -> dict:
+        """Returns a dict mapping each of the given columns (or every column, if None) to its
+        values in year, memory-mapped rather than read."""
+        return {name: numpy.load(os.path.join(self._path(year), name + '.npy'), mmap_mode='r')
+                for name in (COLUMNS if columns is None else columns)}
+
+    def load(self, columns: Iterable[str], years: Optional[Iterable[int]] = None) -> dict:
+        """Returns a dict mapping each of the given per-article columns ('article', 'distinct',
+        'total' or 'cai') to its values over all the given years (or every stored year, if
+        None), along with a 'year' column holding the year of each row.
+
+        Unlike load_year, the columns of the years are copied into a single array each.
+        """
+        years = self.years() if years is None else list(years)
+        columns = list(columns)
+        loaded = [self.load_year(year, set(columns) | {'article'}) for year in years]
+        result = {name: numpy.concatenate([year_columns[name] for year_columns in loaded]
+                                          + [numpy.array([], dtype=COLUMNS[name])])
+                  for name in columns}
+        result['year'] = numpy.repeat(numpy.array(years, dtype=numpy.int64),
+                                      [len(year_columns['article']) for year_columns in loaded])
+        return result
+
+    def keywords(self, year: int) -> list:
+        """Returns the keywords of year, indexed by their keyword id."""
+        return self._meta(year)['keywords']
+
+    def num_articles(self, year: int) -> Optional[int]:
+        """Returns the number of articles processed in year, or None if it is not known."""
+        return self._meta(year)['num_articles']
+
+    def keyword_counts(self, year: int) -> list:
+        """Returns the (keyword, count) pairs of each stored article of year."""
+        keywords = self.keywords(year)
+        columns = self.load_year(year, ['keyword_ptr', 'keyword_id', 'keyword_count'])
+        ptr = columns['keyword_ptr'].tolist()
+        pairs = list(zip((keywords[i] for i in columns['keyword_id'].tolist()),
+                         columns['keyword_count'].tolist()))
+        return [pairs[start:end] for start, end in zip(ptr, ptr[1:])]
+
+    def import_processed_data(self, year: int, filename: str,
+                              num_articles: Optional[int] = None) -> None:
+        """Stores the results of year read from filename, a processed data file written by
+        find_climate_articles.articles_process_yearly before this store existed."""
+        self.write_year(year, read_processed_data(filename), num_articles)
+
+    def _meta(self, year: int) -> dict:
+        """Returns the contents of the meta.json of year."""
+        with open(os.path.join(self._path(year), 'meta.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _path(self, year: int) -> str:
+        """Returns the directory of year."""
+        return os.path.join(self.directory, str(year))
+
+
+def read_processed_data(filename: str) -> list:
+    """Returns the rows of filename, a processed data file written by
+    find_climate_articles.articles_process_yearly, with each value parsed back into its type."""
+    with open(filename, 'r', encoding='utf-8', errors='ignore') as f:
+        return [[int(row[0]), int(row[1]), int(row[2]), float(row[3]), ast.literal_eval(row[4])]
+                for row in csv.reader(f)]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': [
+            'ast', 'csv', 'json', 'os', 'shutil', 'tempfile', 'typing', 'numpy', 'python_ta.contracts'
+        ],
+        'allowed-io': [
+            'ResultsStore.write_year', 'ResultsStore._meta', 'read_processed_data'
+        ],
+        'max-line-length': 100,
+        'max-locals': 25,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
@@ -0,0 +1,71 @@
+"""Climate Change Awareness (CliChA), Run Manifest
+
+This module provides the RunManifest, a record of the years of a dataset that have finished
+processing and of what they were processed from, so that long runs can be resumed.
+
+Copyright (c) 2020 Akshat Naik and Tony Hu.
+Licensed under the MIT License. See LICENSE in the project root for license information.
+"""
+import json
+import os
+from atomic_file import write_atomically
+
+
+class RunManifest:
+    """A record, stored as JSON, of the years whose processing has completed.
+
+    Each year maps to an entry describing what the year was processed from (for ex: the hash of
+    the input file, the hash of the keyword list and the matcher attribute) along with a
+    completion marker. A year only counts as complete if its entry matches the current one, so a
+    year whose source text or settings changed since it was processed is processed again.
+
+    Instance Attributes:
+        - path: the path of the JSON file
+        - years: a dict mapping each year (as a str) to its entry
+    """
+    path: str
+    years: dict
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.years = json.load(f)
+        else:
+            self.years = {}
+
+    def is_complete(self, year: int, entry: dict) -> bool:
+        """Returns whether year has completed processing with the given entry."""
+        return self.years.get(str(year)) == {**entry, 'complete': True}
+
+    def mark_complete(self, year: int, entry: dict) -> None:
+        """Records that year has completed processing with the given entry, and saves the
+        manifest."""
+        self.years[str(year)] = {**entry, 'complete': True}
+        self.save()
+
+    def save(self) -> None:
+        """Writes the manifest to self.path, atomically so that a crash can never leave it
+        half-written."""
+        write_atomically(self.path, 'w',
+                         lambda f: json.dump(self.years, f, indent=2, sort_keys=True),
+                         encoding='utf-8')
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['json', 'os', 'atomic_file', 'python_ta.contracts'],
+        'allowed-io': ['RunManifest.__init__'],
+        'max-line-length': 100,
+        'max-locals': 25,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
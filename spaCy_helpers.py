@@ -5,17 +5,245 @@ This module provides spaCy helper functions, to be used for processing in other
 Copyright (c) 2020 Akshat Naik and Tony Hu.
 Licensed under the MIT License. See LICENSE in the project root for license information.
 """
-from collections import Counter
-from math import log
+import re
+import sys
+import tracemalloc
+from collections import Counter, deque
+from functools import lru_cache
 from os import error
+from typing import Iterable, Iterator, Optional, Union
+import numpy
 import spacy
+from spacy.attrs import IS_PUNCT, IS_SPACE, IS_STOP, LEMMA, LOWER, NORM, ORTH
+from doc_cache import DOC_ATTRS, DocCache
+from keyword_automaton import KeywordAutomaton
+from tfidf_engine import DocumentFrequencyCounter
+try:
+    import resource
+except ImportError:  # the resource module is only available on Unix
+    resource = None
 
 
+ARTICLE_DELIMITER = "--------"
 stop_list = ["Mr.", "Ms.", "Mrs.", "say", "'s", "Dr."]
-nlp = spacy.load('en_core_web_sm', disable=["tagger", "parser", "ner"])
-phrase_nlp = spacy.load('en_core_web_sm', disable=["ner"])
-nlp.Defaults.stop_words.update(stop_list)
-phrase_nlp.Defaults.stop_words.update(stop_list)
+MODEL = 'en_core_web_sm'
+
+
+# the components of the pipeline run on the Docs that are tagged. The lemmas come from the
+# tagger alone, and nothing uses the parse or the entities, so the parser and the ner are not
+# even loaded.
+TAGGING_COMPONENTS = ("tagger",)
+
+# estimates of the peak memory, in bytes, allocated while a character of text is parsed: by the
+# tokenizer alone, and by the tokenizer and the TAGGING_COMPONENTS, whose activations and
+# tensors dwarf the tokens themselves. They can be measured with measure_bytes_per_char. The
+# tokenizer one was: batches of 10 to 200 science_daily_small articles measured 31 to 33 bytes
+# a character. The tagging one is a guess at ten times as much, not a measurement, so it should
+# be measured again with the model the corpora are parsed with. Either way, a memory_budget (see
+# pipe) is only as accurate as these estimates.
+BYTES_PER_CHAR = {(): 40, TAGGING_COMPONENTS: 400}
+
+# the number of characters of a text parsed at once. Longer texts (for ex: articles that were
+# concatenated by mistake) are split into chunks of at most this many characters, well under
+# the max_length of the pipeline, so that no single text can stall or exhaust a worker
+MAX_CHUNK_CHARS = 100_000
+# the boundaries texts are split at, most preferred first: the end of a line (and of the
+# whitespace after it), the end of a sentence and any whitespace. The tokenizer splits on
+# whitespace before anything else, so splitting a text at one of these boundaries gives
+# exactly the same tokens, and no match can span the first two.
+SPLIT_POINTS = [re.compile(r'\n\s*(?=\S)'), re.compile(r'[.!?]\s+(?=\S)'), re.compile(r'\s+(?=\S)')]
+
+
+@lru_cache(maxsize=None)
+def get_nlp() -> spacy.language.Language:
+    """Returns the pipeline shared by every function in this module, with only the tokenizer
+    and the tagger loaded.
+
+    Each call runs only the components it needs (see pipe), so a single copy of the model,
+    its vocab and its StringStore is kept in memory, whether the Docs are tagged or not.
+    The pipeline is loaded the first time it is needed rather than when this module is
+    imported, so that importing this module (for ex: when opening the GUI) stays cheap.
+    """
+    pipeline = spacy.load(MODEL, disable=["parser", "ner"])
+    pipeline.Defaults.stop_words.update(stop_list)
+    return pipeline
+
+
+def pipelines_loaded() -> int:
+    """Returns the number of pipelines loaded so far in this process (at most 1)."""
+    return get_nlp.cache_info().currsize
+
+
+def __getattr__(name: str) -> object:
+    """Returns what nlp and phrase_nlp used to be, loading the shared pipeline on first access,
+    so that they can still be used as attributes of this module (for ex: spaCy_helpers.nlp).
+
+    nlp was the pipeline with every component disabled, so it is the tokenizer of the shared
+    pipeline, which tokenizes a text (or, with its pipe method, many texts) without tagging it.
+    phrase_nlp was the tagging pipeline, so it is the shared pipeline itself.
+    """
+    if name == 'nlp':
+        return get_nlp().tokenizer
+    if name == 'phrase_nlp':
+        return get_nlp()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def pipe(texts: Iterable[str], components: tuple = (), batch_size: int = 100,
+         memory_budget: Optional[int] = None,
+         max_chunk_chars: Optional[int] = MAX_CHUNK_CHARS) -> Iterator[spacy.tokens.Doc]:
+    """Yields a Doc object for each text in texts, tokenized by the shared pipeline and then
+    processed by only the given components of it, lazily in batches of batch_size.
+
+    This is what nlp.pipe would do with the other components disabled. They are skipped here
+    instead, since disabling them (with nlp.select_pipes) would affect every other caller of
+    the shared pipeline until the Docs have all been yielded.
+
+    If a memory_budget is given, the batches are sized by the characters of their texts instead:
+    each batch takes as many texts as fit in the budget (by BYTES_PER_CHAR), up to batch_size,
+    so a batch of long articles is smaller than a batch of short ones. A text that does not fit
+    on its own is processed alone. The budget is approximate: the memory a batch actually takes
+    is not measured, but estimated from its characters.
+
+    A text longer than max_chunk_chars is split with split_text into chunks that are processed
+    separately, and the Docs of its chunks are merged back into a single Doc.
+
+    Instance Attributes:
+        - texts: an iterable of texts, for ex: the articles of a file
+        - components: the names of the components to run, for ex: TAGGING_COMPONENTS.
+        They are run in the order of the pipeline.
+        - batch_size: the number of texts processed together
+        - memory_budget: the number of bytes a batch may take while it is processed, if any
+        - max_chunk_chars: the number of characters of a text processed at once, or None to
+        process every text whole
+
+    A text processed in chunks gives the same Doc as the text processed whole:
+
+    >>> text = 'Sea ice melts.\\nGlaciers retreat as the seas rise. Sea ice melts again.'
+    >>> [doc] = pipe([text], max_chunk_chars=20)
+    >>> whole = get_nlp().tokenizer(text)
+    >>> doc.text == text, [token.text for token in doc] == [token.text for token in whole]
+    (True, True)
+    >>> matcher = phrase_matcher(['sea ice', 'glaciers'])
+    >>> len(doc) == len(whole), phrase_matching(doc, matcher) == phrase_matching(whole, matcher)
+    (True, True)
+    """
+    if max_chunk_chars is not None:
+        num_chunks = deque()
+        chunks = (chunk for text in texts
+                  for chunk in _counted(split_text(text, max_chunk_chars), num_chunks))
+        return _merge_chunks(pipe(chunks, components, batch_size, memory_budget, None), num_chunks)
+    if memory_budget is not None:
+        per_char = BYTES_PER_CHAR[TAGGING_COMPONENTS] if components else BYTES_PER_CHAR[()]
+        return (doc for batch in _batches(texts, batch_size, memory_budget // per_char)
+                for doc in pipe(batch, components, len(batch), None, None))
+    nlp = get_nlp()
+    docs = nlp.tokenizer.pipe(texts, batch_size=batch_size)
+    for name, component in nlp.pipeline:
+        if name in components:
+            if hasattr(component, 'pipe'):
+                docs = component.pipe(docs, batch_size=batch_size)
+            else:
+                docs = map(component, docs)
+    return docs
+
+
+def _batches(texts: Iterable[str], batch_size: int, max_chars: int) -> Iterator[list]:
+    """Yields lists of consecutive texts of at most batch_size texts and (unless a text is
+    longer on its own) at most max_chars characters in total."""
+    batch, chars = [], 0
+    for text in texts:
+        if batch and (len(batch) == batch_size or chars + len(text) > max_chars):
+            yield batch
+            batch, chars = [], 0
+        batch.append(text)
+        chars += len(text)
+    if batch:
+        yield batch
+
+
+def split_text(text: str, max_chars: int) -> list:
+    """Returns text split into consecutive chunks of at most max_chars characters each, at the
+    most preferred of the SPLIT_POINTS found in each chunk (or anywhere, if there are none).
+
+    >>> split_text('Sea ice melts.\\nGlaciers retreat. Seas rise.', 20)
+    ['Sea ice melts.\\n', 'Glaciers retreat. ', 'Seas rise.']
+    """
+    chunks = []
+    start = 0
+    while len(text) - start > max_chars:
+        end = start + max_chars
+        for split_point in SPLIT_POINTS:
+            boundaries = [match.end() for match in split_point.finditer(text, start + 1, end)]
+            if boundaries:
+                end = boundaries[-1]
+                break
+        chunks.append(text[start:end])
+        start = end
+    chunks.append(text[start:])
+    return chunks
+
+
+def _counted(chunks: list, num_chunks: deque) -> list:
+    """Returns chunks, after appending their number to num_chunks."""
+    num_chunks.append(len(chunks))
+    return chunks
+
+
+def _merge_chunks(docs: Iterator[spacy.tokens.Doc], num_chunks: deque) -> Iterator[spacy.tokens.Doc]:
+    """Yields the Docs of each text processed by pipe, merging the Docs of the chunks of a text
+    that was split into a single Doc, with the same tokens and token attributes.
+
+    Instance Attributes:
+        - docs: the Docs of the chunks of the texts, in order
+        - num_chunks: the number of chunks of each text, in order. The number of chunks of a
+        text is appended before its Docs are yielded by docs.
+    """
+    docs = iter(docs)
+    for doc in docs:
+        chunk_docs = [doc] + [next(docs) for _ in range(num_chunks.popleft() - 1)]
+        if len(chunk_docs) == 1:
+            yield doc
+            continue
+        tokens = [token for chunk in chunk_docs for token in chunk]
+        merged = spacy.tokens.Doc(doc.vocab, words=[token.text for token in tokens],
+                                  spaces=[bool(token.whitespace_) for token in tokens])
+        # the same attributes the DocCache keeps, so a merged Doc is like one read from it
+        merged.from_array(DOC_ATTRS, numpy.concatenate([chunk.to_array(DOC_ATTRS) for chunk in chunk_docs]))
+        yield merged
+
+
+def measure_bytes_per_char(texts: list, components: tuple = ()) -> float:
+    """Returns the peak memory, in bytes, allocated while texts are processed by pipe as a single
+    batch with the given components, per character of the texts, i.e. what BYTES_PER_CHAR
+    estimates for components.
+
+    Unlike peak_rss, which is the peak of the whole life of the process, this measures the batch
+    alone, with tracemalloc, which sees the memory allocated by spaCy as well. The pipeline is
+    loaded and given texts once before measuring, so the memory kept by the model and the vocab
+    is not counted.
+    """
+    list(pipe(texts, components, len(texts), None, None))
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = tracemalloc.get_traced_memory()[0]
+    list(pipe(texts, components, len(texts), None, None))
+    peak = tracemalloc.get_traced_memory()[1]
+    if not was_tracing:
+        tracemalloc.stop()
+    return (peak - start) / max(sum(len(text) for text in texts), 1)
+
+
+def peak_rss() -> Optional[int]:
+    """Returns the peak resident set size of this process so far, in bytes, or None if it
+    cannot be measured on this platform."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # it is in bytes on macOS, and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
 
 
 def doc_from_text(filename: str) -> spacy.tokens.Doc:
@@ -26,35 +254,163 @@ def doc_from_text(filename: str) -> spacy.tokens.Doc:
     """
     with open(filename, 'r', encoding='utf-8', errors='ignore') as f:
         text = f.read()
-    doc = nlp(text)
+    doc = get_nlp().make_doc(text)
     return doc
 
 
-def list_doc_from_text(filename: str, num: int = -1, tagging: bool = False) -> spacy.tokens.Doc:
+def list_doc_from_text(filename: str, num: int = -1, tagging: bool = False) -> list:
     """Returns a list of the first num Doc objects from the text in filename.
 
     Instance Attributes:
         - filename: the name of the file
         - num: the number of Doc objects to be returned.
         if num  == -1, then all Doc objects from the text are returned
-        - tagging: bool indicating whether to tag and parse the text or not
+        - tagging: bool indicating whether to tag the text or not
+
+    CAUTION: Every Doc is kept in memory at once. Prefer iter_doc_from_text for large files.
     """
-    with open(filename, 'r', encoding='utf-8', errors='ignore') as f:
-        texts = f.read().split("--------")
-    if num != -1:
-        texts = texts[:num]
-    else:
-        num = len(texts)
-    if tagging:
-        docs = []
-        # To prevent excess memory consumption and termination of task.
-        for i in range((num // 100) + 1):
-            docs += list(phrase_nlp.pipe(texts[i * 100: (i + 1) * 100]))
+    return list(iter_doc_from_text(filename, num, tagging))
+
+
+def iter_doc_from_text(filename: str, num: int = -1, tagging: bool = False,
+                       batch_size: int = 100, cache: Optional[DocCache] = None,
+                       lookup_lemmas: bool = False, prefilter: Optional[re.Pattern] = None,
+                       memory_budget: Optional[int] = None,
+                       with_indices: bool = False) -> Iterator[spacy.tokens.Doc]:
+    """Yields the first num Doc objects from the text in filename, one at a time.
+
+    Articles are streamed off disk and parsed lazily in batches of batch_size, so only
+    one batch of Doc objects needs to be in memory at any given time.
+    If a cache is given, the Docs are deserialized from it when filename has been parsed
+    the same way before, and stored in it otherwise.
+    If a prefilter is given, only the texts (of the first num) that may_match it are parsed.
+    Each text is read and scanned once, as it is parsed, so with_indices is the way to find out
+    which texts the Docs are of.
+
+    Instance Attributes:
+        - filename: the name of the file
+        - num: the number of Doc objects to be yielded.
+        if num  == -1, then all Doc objects from the text are yielded
+        - tagging: bool indicating whether to tag the text or not
+        - batch_size: the number of texts parsed together
+        - cache: the DocCache to use, if any
+        - lookup_lemmas: bool indicating whether to lemmatize the Docs with lookup_lemmatize
+        - prefilter: the pattern returned by keyword_prefilter to skip texts with, if any
+        - memory_budget: the number of bytes a batch may take while it is parsed, if any
+        (see pipe)
+        - with_indices: bool indicating whether to yield (index of the text, Doc) pairs instead
+    """
+    texts = iter_texts_from_file(filename, num)
+    # the indices of the texts that passed the prefilter but whose Docs are not yielded yet
+    indices = deque()
+    if prefilter is not None:
+        texts = _passing_texts(texts, prefilter, indices)
+    if cache is None:
+        docs = iter_docs(texts, tagging, batch_size, lookup_lemmas, memory_budget)
     else:
-        docs = list(nlp.pipe(texts))
+        components = TAGGING_COMPONENTS if tagging else ()
+        # iter_docs chunks the texts longer than MAX_CHUNK_CHARS, which changes their Docs
+        extra = (components, num, MAX_CHUNK_CHARS)
+        if prefilter is not None:
+            extra += (prefilter.pattern,)
+        # the lookup lemmas are cheap to set again, so the cache only holds the parsed Docs
+        docs = cache.cached_docs(
+            cache.key(filename, get_nlp(), *extra), get_nlp().vocab,
+            lambda: iter_docs(texts, tagging, batch_size, memory_budget=memory_budget)
+        )
+        if lookup_lemmas:
+            docs = map(lookup_lemmatize, docs)
+    if not with_indices:
+        return docs
+    if prefilter is None:
+        return enumerate(docs)
+    return _indexed_docs(docs, texts, indices)
+
+
+def _passing_texts(texts: Iterable[str], prefilter: re.Pattern,
+                   indices: deque) -> Iterator[str]:
+    """Yields the texts that may_match prefilter, appending the index of each to indices."""
+    for i, text in enumerate(texts):
+        if may_match(text, prefilter):
+            indices.append(i)
+            yield text
+
+
+def _indexed_docs(docs: Iterable[spacy.tokens.Doc], texts: Iterator[str],
+                  indices: deque) -> Iterator[tuple]:
+    """Yields the (index, Doc) pair of each Doc in docs, where texts are the texts (returned
+    by _passing_texts) the Docs are parsed from, and indices their indices.
+
+    A Doc parsed from texts is yielded after its text has been read, so its index is already in
+    indices. A Doc deserialized from a cache is not, so the next text is read to find its index.
+    """
+    for doc in docs:
+        if not indices:
+            next(texts)
+        yield indices.popleft(), doc
+
+
+def doc_options(attribute: str) -> dict:
+    """Returns the keyword arguments of iter_doc_from_text (or iter_docs) that produce the Docs
+    a matcher returned by phrase_matcher(terms, attribute) matches on.
+
+    >>> doc_options('LEMMA_LOOKUP')
+    {'tagging': False, 'lookup_lemmas': True}
+    """
+    return {
+        'tagging': attribute not in ("LOWER", "LEMMA_LOOKUP"),
+        'lookup_lemmas': attribute == "LEMMA_LOOKUP"
+    }
+
+
+def iter_docs(texts: Iterable[str], tagging: bool = False, batch_size: int = 100,
+              lookup_lemmas: bool = False,
+              memory_budget: Optional[int] = None) -> Iterator[spacy.tokens.Doc]:
+    """Yields a Doc object for each text in texts, parsed lazily in batches of batch_size.
+
+    Instance Attributes:
+        - texts: an iterable of texts, for ex: the articles of a file
+        - tagging: bool indicating whether to tag the text or not
+        if tagging is False, the texts are only tokenized
+        - batch_size: the number of texts parsed together
+        - lookup_lemmas: bool indicating whether to lemmatize the Docs with lookup_lemmatize
+        - memory_budget: the number of bytes a batch may take while it is parsed, if any
+        (see pipe)
+    """
+    # Matching on LOWER needs nothing but the tokens, so skip the tagger altogether.
+    docs = pipe(texts, TAGGING_COMPONENTS if tagging else (), batch_size, memory_budget)
+    if lookup_lemmas:
+        return map(lookup_lemmatize, docs)
     return docs
 
 
+def iter_texts_from_file(filename: str, num: int = -1, chunk_size: int = 1 << 20) -> Iterator[str]:
+    """Yields the first num texts in filename separated by ARTICLE_DELIMITER.
+
+    The file is read chunk_size characters at a time instead of all at once. The texts yielded
+    are exactly those of f.read().split(ARTICLE_DELIMITER), including the trailing
+    'Articles crawled: N' text written by the TextWriter.
+
+    Instance Attributes:
+        - filename: the name of the file
+        - num: the number of texts to be yielded.
+        if num  == -1, then all texts from the file are yielded
+        - chunk_size: the number of characters read from the file at once
+    """
+    count = 0
+    with open(filename, 'r', encoding='utf-8', errors='ignore') as f:
+        remainder = ''
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            *texts, remainder = (remainder + chunk).split(ARTICLE_DELIMITER)
+            for text in texts:
+                if count == num:
+                    return
+                yield text
+                count += 1
+    if count != num:
+        yield remainder
+
+
 def term_frequency_dict(doc: spacy.tokens.Doc) -> dict:
     """Returns a dict of the term frequency of each term in the given doc.
 
@@ -63,23 +419,66 @@ def term_frequency_dict(doc: spacy.tokens.Doc) -> dict:
 
     Term Frequency(t) = number of times term t appears in a document / the total number of terms in the document
     """
-    words = [preprocess_token(token) for token in doc if is_token_allowed(token)]
-    count = Counter(words)
-    return {word: count[word] / len(words) for word in count}
+    count = term_counts(doc)
+    num_words = sum(count.values())
+    return {word: count[word] / num_words for word in count}
 
 
-def inverse_document_frequency_dict(tf_dicts: list) -> dict:
+def term_counts(doc: spacy.tokens.Doc) -> Counter:
+    """Returns a Counter of the number of times each term appears in the given doc, which is
+    what a row of a tfidf_engine.TermDocumentMatrix is built from.
+
+    The terms are those of preprocess_token over the tokens allowed by is_token_allowed, in the
+    order they first occur, but no Token objects are created: the attributes of every token are
+    read into an array at once, filtered with a mask and counted by their hash, and only the
+    distinct lemmas are decoded into strings.
+
+    Instance Attributes:
+        - doc: an instance of a Doc class
+
+    The counts (and their order) are those of counting the tokens one at a time, whether the
+    doc was tagged or only tokenized:
+
+    >>> text = 'The seas rose, and the sea ice melted as the Seas rose again.'
+    >>> for doc in (get_nlp()(text), get_nlp().tokenizer(text)):
+    ...     expected = Counter(preprocess_token(token) for token in doc if is_token_allowed(token))
+    ...     print(list(term_counts(doc).items()) == list(expected.items()))
+    True
+    True
+    """
+    if len(doc) == 0:
+        return Counter()
+    # a token whose text strips to nothing is exactly a space token
+    array = doc.to_array([LEMMA, ORTH, IS_STOP, IS_PUNCT, IS_SPACE])
+    array = array[(array[:, 2] == 0) & (array[:, 3] == 0) & (array[:, 4] == 0)]
+    lemmas = array[:, 0]
+    untagged = lemmas == 0
+    if untagged.any():
+        orths, positions = numpy.unique(array[untagged, 1], return_inverse=True)
+        lemmas[untagged] = numpy.array([_lemma_of(orth) for orth in orths.tolist()],
+                                       dtype='uint64')[positions.reshape(-1)]
+    hashes, first, counts = numpy.unique(lemmas, return_index=True, return_counts=True)
+    order = numpy.argsort(first, kind='stable')
+    strings = doc.vocab.strings
+    counter = Counter()
+    # different lemmas (for ex: 'The' and 'the') may make the same term
+    for lemma, count in zip(hashes[order].tolist(), counts[order].tolist()):
+        counter[strings[lemma].strip().lower()] += count
+    return counter
+
+
+def inverse_document_frequency_dict(tf_dicts: Iterable[dict]) -> dict:
     """Returns a dict of inverse document frequency of each term.
 
     Instance Attributes:
-        - tf_dicts: list of Term Frequency dicts, each corresponding to a single Doc.
+        - tf_dicts: Term Frequency dicts, each corresponding to a single Doc.
+        They are consumed one at a time, so they may be generated lazily.
 
     Inverse Document Frequency(t) = log_e(Total number of documents/ Number of documents with term t in it)
     """
-    words = Counter()  # Dict of all the words occuring in at least one of the documents
-    for tf_dict in tf_dicts:
-        words = words + Counter(tf_dict.keys())
-    return {word: log(len(tf_dicts) / words[word]) for word in words}
+    counter = DocumentFrequencyCounter()
+    counter.update(tf_dicts)
+    return counter.idf_dict()
 
 
 def tf_idf(term: str, tf_dict: dict, idf_dict: dict) -> float:
@@ -119,51 +518,174 @@ def is_token_allowed(token: spacy.tokens.Token) -> bool:
 
 
 def preprocess_token(token: spacy.tokens.Token) -> str:
-    """Returns the lowercased lemmatized version of the token."""
-    return token.lemma_.strip().lower()
+    """Returns the lowercased lemmatized version of the token.
+
+    Tokens that were not lemmatized by the pipeline (for ex: those of a Doc that was only
+    tokenized) are lemmatized with the lookup table, as spaCy itself does.
+    """
+    lemma = token.lemma_ if token.lemma != 0 else lookup_lemma(token.text)
+    return lemma.strip().lower()
+
+
+def lookup_lemmatize(doc: spacy.tokens.Doc) -> spacy.tokens.Doc:
+    """Sets the lemma (and the norm) of each token in doc to the lemma of its lowercase form in
+    the lookup table, and returns doc.
 
+    This gives lemmas close to those of the tagger at the cost of a table lookup, which is only
+    done once for each distinct lowercase form. The norm is set as well, for the PhraseMatcher
+    returned by phrase_matcher with the 'LEMMA_LOOKUP' attribute to match on.
 
-def phrase_matching(doc: spacy.tokens.Doc, matcher: spacy.matcher.PhraseMatcher) -> tuple:
+    The lemmas are those of looking up each token one at a time:
+
+    >>> doc = lookup_lemmatize(get_nlp().tokenizer('The Seas were rising, and the seas rose.'))
+    >>> [token.lemma_ for token in doc] == [lookup_lemma(token.lower_) for token in doc]
+    True
+    >>> [token.norm_ for token in doc] == [token.lemma_ for token in doc]
+    True
+    """
+    if len(doc) == 0:
+        return doc
+    lowers, positions = numpy.unique(doc.to_array(LOWER), return_inverse=True)
+    lemmas = numpy.array([_lemma_of(lower) for lower in lowers.tolist()], dtype='uint64')
+    lemmas = lemmas[positions.reshape(-1)]
+    doc.from_array([LEMMA, NORM], numpy.stack([lemmas, lemmas], axis=1))
+    return doc
+
+
+@lru_cache(maxsize=None)
+def _lemma_of(text: int) -> int:
+    """Returns the hash of the lookup lemma of the text (for ex: a lowercase form) whose hash is
+    text."""
+    strings = get_nlp().vocab.strings
+    return strings.add(lookup_lemma(strings[text]))
+
+
+@lru_cache(maxsize=None)
+def lookup_lemma(text: str) -> str:
+    """Returns the lemma of text in the lookup table of the pipeline, or text itself if it has
+    none. This is the lemma spaCy gives to an untagged token with that text.
+
+    The lemmas are memoized, since the same words occur over and over again in the articles.
+    """
+    return get_nlp().vocab.lookups.get_table("lemma_lookup", {}).get(text, text)
+
+
+def phrase_matching(doc: Union[spacy.tokens.Doc, str],
+                    matcher: Union[spacy.matcher.PhraseMatcher, KeywordAutomaton]) -> tuple:
     """Returns a tuple containing number of matches (int) and a Counter object representing
     the number of times each term appears in the given doc.
 
     Instance Attributes:
-        - doc: an instance of a Doc class
-        - matcher: a PhraseMatcher object to be used for matching
+        - doc: an instance of a Doc class, or the raw text of one if matcher is a KeywordAutomaton
+        - matcher: a PhraseMatcher or KeywordAutomaton object to be used for matching
     """
-    matches = matcher(doc)
-    counter = Counter(preprocess_token(token) for _, start, end in matches for token in doc[start:end])
+    if isinstance(matcher, KeywordAutomaton):
+        text = doc if isinstance(doc, str) else doc.text
+        matches = matcher.find(text)
+        # the words of a term are separated by single spaces, just like its tokens would be
+        counter = Counter(lookup_lemma(word).strip().lower()
+                          for start, end, _ in matches for word in text[start:end].split(' '))
+    else:
+        matches = matcher(doc)
+        counter = Counter(preprocess_token(token) for _, start, end in matches for token in doc[start:end])
     counter_items = counter.most_common()
     return len(matches), len(counter_items), counter_items
 
 
-def phrase_matcher(terms: list, attribute: str = "LOWER") -> spacy.matcher.PhraseMatcher:
-    """Returns a PhraseMatcher object to be used for matching in phrase_matching.
+def keyword_prefilter(terms: list, attribute: str = "LOWER") -> Optional[re.Pattern]:
+    """Returns a pattern that is found in the lowercased text of every article in which the
+    matcher returned by phrase_matcher(terms, attribute) can find a match, or None if there is
+    no such pattern for attribute.
+
+    The pattern is the longest token of each term, lowercased, so an article in which it is not
+    found has no match, and need not even be tokenized (see may_match). Only the 'LOWER'
+    attribute has such a pattern, since with the others a token can match a term without its
+    text containing any token of the term (for ex: 'went' has the lemma 'go').
+    """
+    if attribute != "LOWER":
+        return None
+    words = set()
+    for doc in get_nlp().tokenizer.pipe(terms):
+        tokens = [token.lower_ for token in doc if not token.is_space]
+        if tokens:
+            words.add(max(tokens, key=len))
+    if not words:
+        # no term can match at all
+        return re.compile(r'(?!)')
+    # sorted, so that the pattern (and so the key of the Docs cached with it) is the same in
+    # every run
+    return re.compile('|'.join(re.escape(word) for word in sorted(words)))
+
+
+def may_match(text: str, prefilter: re.Pattern) -> bool:
+    """Returns whether the article text may have a match, according to the pattern returned by
+    keyword_prefilter."""
+    return prefilter.search(text.lower()) is not None
+
+
+def phrase_matcher(terms: list, attribute: str = "LOWER",
+                   backend: str = "spacy") -> Union[spacy.matcher.PhraseMatcher, KeywordAutomaton]:
+    """Returns a PhraseMatcher (or KeywordAutomaton) object to be used for matching in
+    phrase_matching.
 
     Instance Attributes:
         - terms: a list of terms to match with
         - attribute: the Token attribute to match on
-        Useful options for attribute are 'LOWER' and 'LEMMA'
+        Useful options for attribute are 'LOWER', 'LEMMA' and 'LEMMA_LOOKUP'.
+        'LEMMA_LOOKUP' matches on the lemmas set by lookup_lemmatize, which need no tagging,
+        so it gives results close to 'LEMMA' at a cost close to 'LOWER'.
+        - backend: 'spacy' for a PhraseMatcher, or 'aho-corasick' for a KeywordAutomaton, which
+        matches on the raw text of the articles without tokenizing them.
+        The 'aho-corasick' backend only supports the 'LOWER' attribute.
 
     CAUTION: Passing 'LEMMA' as the attribute will cause the function runtime to increase more
     than an order of magnitude when compared to passing 'LOWER'.
     """
-    matcher = spacy.matcher.PhraseMatcher(nlp.vocab, attr=attribute)  # attr="LEMMA" or "LOWER"
-    if attribute != "LOWER":
-        patterns = [phrase_nlp(term) for term in terms]
-        # OR: patterns = list(nlp.tokenizer.pipe(terms)) - is faster for more terms
+    if backend == "aho-corasick":
+        if attribute != "LOWER":
+            raise ValueError("The aho-corasick backend only supports the 'LOWER' attribute.")
+        return KeywordAutomaton(terms)
+    elif backend != "spacy":
+        raise ValueError(f"Unknown matcher backend: {backend}")
+    if attribute == "LEMMA_LOOKUP":
+        matcher = spacy.matcher.PhraseMatcher(get_nlp().vocab, attr="NORM")
+        patterns = [lookup_lemmatize(doc) for doc in get_nlp().tokenizer.pipe(terms)]
+    elif attribute != "LOWER":
+        matcher = spacy.matcher.PhraseMatcher(get_nlp().vocab, attr=attribute)
+        patterns = list(pipe(terms, TAGGING_COMPONENTS))
     else:
-        patterns = [nlp(term) for term in terms]
+        matcher = spacy.matcher.PhraseMatcher(get_nlp().vocab, attr=attribute)
+        patterns = list(get_nlp().tokenizer.pipe(terms))
     matcher.add("TerminologyList", None, *patterns)
     # Instead of None, you can use an on_match callback. (eg: print("WE HAVE ATLEAST ONE MATCH WOOHOO"))
     return matcher
 
 
+def keyword_lemmas(terms: list) -> list:
+    """Returns the words phrase_matching reports for the tokens of terms, in the order they first
+    occur: preprocess_token over the tokens of each term, as matched with any attribute of
+    phrase_matcher, i.e. only tokenized ('LOWER'), tagged ('LEMMA') and lemmatized with
+    lookup_lemmatize ('LEMMA_LOOKUP').
+    """
+    patterns = list(get_nlp().tokenizer.pipe(terms)) + list(pipe(terms, TAGGING_COMPONENTS)) \
+        + [lookup_lemmatize(doc) for doc in get_nlp().tokenizer.pipe(terms)]
+    return list(dict.fromkeys(preprocess_token(token) for doc in patterns for token in doc
+                              if token.text.strip()))
+
+
 if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
+
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['spacy', 'collections', 'math'],
-        'allowed-io': ['doc_from_text', 'list_doc_from_text'],
+        'extra-imports': [
+            'spacy', 'spacy.attrs', 'numpy', 're', 'sys', 'tracemalloc', 'resource', 'collections',
+            'functools',
+            'typing',
+            'doc_cache', 'keyword_automaton', 'tfidf_engine'
+        ],
+        'allowed-io': ['doc_from_text', 'iter_texts_from_file'],
         'max-line-length': 120,  # writing formulae in two lines looks ugly
         'max-locals': 25,
         # C0103: The library spaCy is stylized with the 'C' being capitalized
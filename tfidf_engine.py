@@ -0,0 +1,246 @@
+"""Climate Change Awareness (CliChA), Vectorized TF-IDF Engine
+
+This module provides the TermDocumentMatrix, a sparse document-term count matrix over which
+term frequencies, inverse document frequencies and tf-idfs are computed as array operations,
+and the DocumentFrequencyCounter, which accumulates document frequencies in a single pass.
+
+Copyright (c) 2020 Akshat Naik and Tony Hu.
+Licensed under the MIT License. See LICENSE in the project root for license information.
+"""
+import json
+from collections import Counter
+from math import log
+from typing import Iterable, Optional
+import numpy
+from atomic_file import write_atomically
+
+
+# the tf-idf of a term with no idf, as in spaCy_helpers.tf_idf
+UNKNOWN_TF_IDF = 1000
+
+
+class TermDocumentMatrix:
+    """A sparse matrix of the number of times each term occurs in each document, stored in
+    Compressed Sparse Row (CSR) form over integer term ids.
+
+    The counts of document i are counts[indptr[i]:indptr[i + 1]], and the id of the term each
+    of them is the count of is at the same position in indices.
+
+    Instance Attributes:
+        - terms: the terms, indexed by their term id, in the order they first occur
+        - term_ids: a dict mapping each term to its term id
+        - indptr: the positions in indices and counts at which each document starts and ends
+        - indices: the term id of each stored count
+        - counts: the non-zero counts
+
+    >>> matrix = TermDocumentMatrix.from_term_counts([{'ice': 2, 'sea': 1}, {'ice': 1}])
+    >>> round(matrix.idf_dict()['sea'], 4)
+    0.6931
+    >>> matrix.tf_dict(0)
+    {'ice': 0.6666666666666666, 'sea': 0.3333333333333333}
+    """
+    terms: list
+    term_ids: dict
+    indptr: numpy.ndarray
+    indices: numpy.ndarray
+    counts: numpy.ndarray
+
+    def __init__(self, terms: list, indptr: numpy.ndarray, indices: numpy.ndarray,
+                 counts: numpy.ndarray) -> None:
+        self.terms = terms
+        self.term_ids = {term: term_id for term_id, term in enumerate(terms)}
+        self.indptr = indptr
+        self.indices = indices
+        self.counts = counts
+
+    @classmethod
+    def from_term_counts(cls, documents: Iterable[dict]) -> 'TermDocumentMatrix':
+        """Returns the matrix of documents, each given as a dict mapping a term to the number of
+        times it occurs in the document (for ex: as returned by spaCy_helpers.term_counts).
+
+        The documents are consumed one at a time, so they may be generated lazily.
+        """
+        terms, term_ids = [], {}
+        indptr, indices, counts = [0], [], []
+        for document in documents:
+            for term, count in document.items():
+                if term not in term_ids:
+                    term_ids[term] = len(terms)
+                    terms.append(term)
+                indices.append(term_ids[term])
+                counts.append(count)
+            indptr.append(len(indices))
+        return cls(terms, numpy.array(indptr, dtype=numpy.int64),
+                   numpy.array(indices, dtype=numpy.int64), numpy.array(counts, dtype=numpy.int64))
+
+    @property
+    def num_docs(self) -> int:
+        """The number of documents (rows) in the matrix."""
+        return len(self.indptr) - 1
+
+    @property
+    def num_terms(self) -> int:
+        """The number of distinct terms (columns) in the matrix."""
+        return len(self.terms)
+
+    def row_ids(self) -> numpy.ndarray:
+        """Returns the document (row) of each stored count."""
+        return numpy.repeat(numpy.arange(self.num_docs), numpy.diff(self.indptr))
+
+    def doc_lengths(self) -> numpy.ndarray:
+        """Returns the total number of terms in each document."""
+        return numpy.bincount(self.row_ids(), weights=self.counts, minlength=self.num_docs)
+
+    def term_frequency(self) -> numpy.ndarray:
+        """Returns the term frequency of each stored count, i.e. the count divided by the
+        total number of terms in its document."""
+        return self.counts / self.doc_lengths()[self.row_ids()]
+
+    def document_frequency(self) -> numpy.ndarray:
+        """Returns the number of documents each term occurs in, indexed by term id."""
+        return numpy.bincount(self.indices, minlength=self.num_terms)
+
+    def inverse_document_frequency(self) -> numpy.ndarray:
+        """Returns the inverse document frequency of each term, indexed by term id.
+
+        Inverse Document Frequency(t) = log_e(Total number of documents/ Number of documents with term t in it)
+        """
+        return numpy.log(self.num_docs / self.document_frequency())
+
+    def idf_vector(self, idf_dict: dict) -> numpy.ndarray:
+        """Returns the idf of each term in idf_dict, indexed by term id, with NaN for the terms
+        that are not in idf_dict."""
+        return numpy.array([idf_dict[term] if term in idf_dict else numpy.nan
+                            for term in self.terms], dtype=numpy.float64)
+
+    def tf_idf(self, idf: numpy.ndarray) -> numpy.ndarray:
+        """Returns the tf-idf of each stored count, given the idf of each term (as returned by
+        self.idf_vector or self.inverse_document_frequency).
+
+        As in spaCy_helpers.tf_idf, the tf-idf of a term with no idf (NaN) is UNKNOWN_TF_IDF.
+        """
+        term_idf = idf[self.indices]
+        return numpy.where(numpy.isnan(term_idf), UNKNOWN_TF_IDF,
+                           self.term_frequency() * term_idf)
+
+    def term_sums(self, values: numpy.ndarray) -> numpy.ndarray:
+        """Returns the sum over all documents of values (one for each stored count, for ex: as
+        returned by self.tf_idf), for each term, indexed by term id."""
+        return numpy.bincount(self.indices, weights=values, minlength=self.num_terms)
+
+    def idf_dict(self) -> dict:
+        """Returns the inverse document frequency of each term, as a dict."""
+        return dict(zip(self.terms, self.inverse_document_frequency().tolist()))
+
+    def tf_dict(self, i: int) -> dict:
+        """Returns the term frequency of each term in document i, as a dict (see
+        spaCy_helpers.term_frequency_dict)."""
+        start, end = self.indptr[i], self.indptr[i + 1]
+        counts = self.counts[start:end]
+        return {self.terms[term_id]: tf for term_id, tf in
+                zip(self.indices[start:end].tolist(), (counts / counts.sum()).tolist())}
+
+
+class DocumentFrequencyCounter:
+    """A running count of the number of documents each term occurs in.
+
+    Documents are added one at a time and the counts are updated in place, so the documents
+    can be streamed from a generator without ever being held in memory together. The partial
+    counts can be saved to a checkpoint and loaded again to carry on where they left off, or to
+    add the documents appended to their source since.
+
+    Instance Attributes:
+        - num_docs: the number of documents added so far
+        - counts: a Counter of the number of documents each term occurs in
+        - offset: the byte at which the documents added so far end in their source, if it is a
+        file that only ever gets appended to (for ex: a corpus file written by the TextWriter)
+
+    >>> counter = DocumentFrequencyCounter()
+    >>> counter.update([{'ice': 0.5, 'sea': 0.5}, {'ice': 1.0}])
+    >>> counter.num_docs, counter.counts['ice']
+    (2, 2)
+    >>> round(counter.idf_dict()['sea'], 4)
+    0.6931
+    >>> counter.idf('sea') == counter.idf_dict()['sea'], counter.idf('coal')
+    (True, None)
+    """
+    num_docs: int
+    counts: Counter
+    offset: int
+
+    def __init__(self, num_docs: int = 0, counts: Optional[dict] = None, offset: int = 0) -> None:
+        self.num_docs = num_docs
+        self.counts = Counter(counts or {})
+        self.offset = offset
+
+    def add(self, terms: Iterable[str]) -> None:
+        """Adds a document, given as its terms (for ex: the keys of its tf dict)."""
+        # each term is counted once, however many times it occurs in the document
+        self.counts.update(dict.fromkeys(terms, 1))
+        self.num_docs += 1
+
+    def update(self, documents: Iterable[Iterable[str]], checkpoint: Optional[str] = None,
+               checkpoint_every: int = 1000) -> None:
+        """Adds each document in documents, each given as its terms.
+
+        Instance Attributes:
+            - documents: an iterable of documents, for ex: a generator of tf dicts
+            - checkpoint: the path to save the counts to every checkpoint_every documents,
+            and once all documents have been added, if any
+            - checkpoint_every: the number of documents added between two checkpoints
+        """
+        for document in documents:
+            self.add(document)
+            if checkpoint is not None and self.num_docs % checkpoint_every == 0:
+                self.save(checkpoint)
+        if checkpoint is not None:
+            self.save(checkpoint)
+
+    def idf_dict(self) -> dict:
+        """Returns the inverse document frequency of each term, as a dict.
+
+        Inverse Document Frequency(t) = log_e(Total number of documents/ Number of documents with term t in it)
+        """
+        return {term: log(self.num_docs / count) for term, count in self.counts.items()}
+
+    def idf(self, term: str) -> Optional[float]:
+        """Returns the inverse document frequency of term, computed from the current counts, or
+        None if term has not occurred in any document."""
+        count = self.counts.get(term)
+        return log(self.num_docs / count) if count else None
+
+    def save(self, path: str) -> None:
+        """Writes the counts to path as JSON, atomically so that a crash can never leave the
+        checkpoint half-written."""
+        saved = {'num_docs': self.num_docs, 'offset': self.offset, 'counts': self.counts}
+        write_atomically(path, 'w', lambda f: json.dump(saved, f), encoding='utf-8')
+
+    @classmethod
+    def load(cls, path: str) -> 'DocumentFrequencyCounter':
+        """Returns the counter saved to path by save."""
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        # checkpoints saved before the offset was kept have none
+        return cls(saved['num_docs'], saved['counts'], saved.get('offset', 0))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': [
+            'json', 'collections', 'math', 'numpy', 'typing', 'atomic_file',
+            'python_ta.contracts'
+        ],
+        'allowed-io': ['DocumentFrequencyCounter.load'],
+        'max-line-length': 120,  # writing formulae in two lines looks ugly
+        'max-locals': 25,
+        'disable': ['R1705', 'C0200']
+    })
+
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()